@@ -6,7 +6,8 @@ settings stored in a .nv file.
 TODO: Modify command-line handling to allow for --on/--off for .nv files without a map.
 """
 import argparse
-import json
+import os
+import sys
 
 import nvram_parser
 
@@ -136,15 +137,6 @@ def main():
             print("No map selected.")
             return
 
-    with open(args.map, 'r') as f:
-        nv_map = json.load(f)
-
-    if args.nvram:
-        with open(args.nvram, 'rb') as f:
-            nv = bytearray(f.read())
-    else:
-        nv = None
-
     if args.rom:
         title = 'DIP Switches for %s' % nvram_parser.rom_name(args.rom)
     else:
@@ -159,24 +151,35 @@ def main():
             print('-' * len(subtitle))
     print()
 
-    save_changes = False
-    if nv:
-        if args.on or args.off:
-            save_changes = True
-            for sw in parse_switch_list(args.on):
-                nvram_parser.dipsw_set(nv, sw, True)
-            for sw in parse_switch_list(args.off):
-                nvram_parser.dipsw_set(nv, sw, False)
+    parser = nvram_parser.ParseNVRAM(None)
+    parser.load_map(args.map)
+    nv = None
+    if args.nvram:
+        editing = bool(args.edit or args.on or args.off)
+        # edit a copy of the .nv file, and only write it back when saving changes
+        parser.load_nvram(args.nvram, use_mmap=not editing)
+        nv = parser.memory.get_pinmame_data()
+        if editing and not nv:
+            print("%s doesn't include DIP switch settings" % args.nvram, file=sys.stderr)
+            exit(1)
 
-    parser = nvram_parser.ParseNVRAM(nv_map, nv)
+    save_changes = False
+    if args.on or args.off:
+        save_changes = True
+        for sw in parse_switch_list(args.on):
+            nvram_parser.dipsw_set(nv, sw, True)
+        for sw in parse_switch_list(args.off):
+            nvram_parser.dipsw_set(nv, sw, False)
 
     if args.edit:
         save_changes = switch_editor(parser)
 
     if save_changes:
         print('Saving changes to %s...' % args.nvram)
-        with open(args.nvram, 'wb') as f:
-            f.write(parser.get_dot_nv())
+        with open(args.nvram, 'r+b') as f:
+            # DIP switches are in the PinMAME data at the end of the file
+            f.seek(-len(nv), os.SEEK_END)
+            f.write(nv)
         exit(0)
 
     if args.edit:
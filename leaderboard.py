@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Venue-wide high score tables, merged from the .nv files of many machines.
+
+Each snapshot's high scores are decoded into typed ScoreEntry tuples (instead
+of the strings from ParseNVRAM.high_scores()), and the latest entries from each
+machine are merged into a top-K table per ROM (or per map, to combine ROM
+revisions that share one).  Tables update incrementally as new snapshots of a
+machine arrive, and are only rebuilt when one of that machine's previous
+entries drops out.
+"""
+import argparse
+import heapq
+import os
+import sys
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple, Union
+
+import nvram_parser
+from nvram_parser import ParseNVRAM, map_for_rom, rom_for_nvpath, rom_name
+
+CATEGORIES = ['high_scores', 'mode_champions']
+
+
+class ScoreEntry(NamedTuple):
+    """A single high score from a machine."""
+    score: Union[int, float]  # float for entries with a fractional `scale`
+    initials: Optional[str]
+    timestamp: Optional[datetime]
+    label: str  # e.g., "Grand Champion" or the name of a mode
+    source: str  # machine or file the score came from
+    rom: str
+
+
+def extract_scores(parser: ParseNVRAM, source: str, rom: str,
+                   section: str = 'high_scores') -> List[ScoreEntry]:
+    """
+    Return the scores in a loaded .nv file.
+
+    :param parser: ParseNVRAM object with a map and .nv file loaded
+    :param source: identifier for the machine (e.g., path of the .nv file)
+    :param rom: ROM name, for reporting
+    :param section: 'high_scores' or 'mode_champions'
+    :return: list of entries with a numeric score (int, or float for entries
+             scaled by a fraction), in map order
+    """
+    entries = []
+    for m in parser.mapping:
+        if m.section != 'score_record' or m.group != section:
+            continue
+        value = m.decode(parser.memory)
+        if not isinstance(value, dict):
+            continue
+        score = value.get('score')
+        if not isinstance(score, (int, float)) or isinstance(score, bool):
+            continue
+        initials = value.get('initials')
+        entries.append(ScoreEntry(score=score,
+                                  initials=initials.strip() if initials else None,
+                                  timestamp=value.get('timestamp'),
+                                  label=m.entry.get('label', '?'),
+                                  source=source,
+                                  rom=rom))
+    return entries
+
+
+def category(section: str, entry: ScoreEntry) -> str:
+    """Return the table name for an entry: 'high_scores', or 'mode_champions/<label>'."""
+    if section == 'mode_champions':
+        return '%s/%s' % (section, entry.label)
+    return section
+
+
+class Leaderboard(object):
+    """
+    Top-K tables of scores across a fleet of machines, keyed by (group, category),
+    where the group is a ROM or a map path, and the category is 'high_scores' or
+    'mode_champions/<mode>' (each mode is ranked separately).
+    """
+    def __init__(self, k: int = 10, group_by: str = 'rom'):
+        """
+        :param k: number of entries in each table
+        :param group_by: 'rom' to rank each ROM separately, or 'map' to combine
+                         all ROMs that use the same map
+        """
+        if group_by not in ['rom', 'map']:
+            raise ValueError('group_by must be "rom" or "map"')
+        self.k = k
+        self.group_by = group_by
+        # latest (group, entries) reported by each source
+        self.latest: Dict[str, Tuple[str, List[Tuple[str, ScoreEntry]]]] = {}
+        # sources in each group
+        self.members: Dict[str, Set[str]] = {}
+        self.tables: Dict[Tuple[str, str], List[ScoreEntry]] = {}
+        # tables to rebuild from self.latest before their next use
+        self.stale: Set[Tuple[str, str]] = set()
+        # ParseNVRAM objects keyed by map path, for update_file()
+        self.parsers = {}
+
+    def update(self, source: str, group: str, entries: Iterable[Tuple[str, ScoreEntry]]) -> None:
+        """
+        Replace the scores from <source>.
+
+        :param source: identifier for the machine
+        :param group: ROM or map path, depending on self.group_by
+        :param entries: (category, entry) tuples; see category()
+        """
+        entries = list(entries)
+        previous = self.latest.get(source)
+        if previous:
+            (old_group, old_entries) = previous
+            self.members[old_group].discard(source)
+            for (name, entry) in old_entries:
+                table = self.tables.get((old_group, name))
+                if table is not None and entry in table:
+                    # removing an entry from a table means rebuilding it
+                    self.stale.add((old_group, name))
+
+        self.latest[source] = (group, entries)
+        self.members.setdefault(group, set()).add(source)
+
+        new_entries = {}
+        for (name, entry) in entries:
+            new_entries.setdefault(name, []).append(entry)
+        for (name, scores) in new_entries.items():
+            key = (group, name)
+            if key in self.tables and key not in self.stale:
+                self.tables[key] = heapq.nlargest(self.k, self.tables[key] + scores,
+                                                  key=lambda e: e.score)
+            else:
+                self.stale.add(key)
+
+    def update_parser(self, source: str, parser: ParseNVRAM, rom: str,
+                      map_path: str) -> None:
+        """Replace the scores from <source> with those in a loaded .nv file."""
+        entries = []
+        for section in CATEGORIES:
+            for entry in extract_scores(parser, source, rom, section):
+                entries.append((category(section, entry), entry))
+        self.update(source, rom if self.group_by == 'rom' else map_path, entries)
+
+    def update_file(self, nvpath: str, map_path: str = None, rom: str = None) -> bool:
+        """
+        Replace the scores for <nvpath> with its current contents.
+        :return: False if there isn't a map for <nvpath>
+        """
+        rom = rom or rom_for_nvpath(nvpath)
+        map_path = map_path or map_for_rom(rom)
+        if not map_path:
+            return False
+        parser = nvram_parser.open_nvram(nvpath, map_path, self.parsers)
+        self.update_parser(nvpath, parser, rom, map_path)
+        return True
+
+    def top(self, group: str, name: str = 'high_scores') -> List[ScoreEntry]:
+        """Return the top-K table for a group and category, highest score first."""
+        key = (group, name)
+        if key in self.stale or key not in self.tables:
+            scores = []
+            # sorted, so tied scores are ranked the same way on every run
+            for source in sorted(self.members.get(group, [])):
+                scores.extend(entry for (n, entry) in self.latest[source][1] if n == name)
+            self.tables[key] = heapq.nlargest(self.k, scores, key=lambda e: e.score)
+            self.stale.discard(key)
+        return self.tables[key]
+
+    def groups(self) -> List[Tuple[str, str]]:
+        """Return the (group, category) keys of all tables, sorted."""
+        keys = set()
+        for (group, entries) in self.latest.values():
+            for (name, _) in entries:
+                keys.add((group, name))
+        return sorted(keys)
+
+    def format(self) -> str:
+        """Return all tables as text."""
+        lines = []
+        for (group, name) in self.groups():
+            title = rom_name(group) if self.group_by == 'rom' else os.path.basename(group)
+            lines.append('%s: %s' % (title, name))
+            for (rank, entry) in enumerate(self.top(group, name), start=1):
+                lines.append('%3u. %-3s %15s  %s%s' % (
+                    rank, entry.initials or '', nvram_parser.format_number(entry.score),
+                    os.path.basename(entry.source),
+                    entry.timestamp.strftime('  %Y-%m-%d %H:%M') if entry.timestamp else ''))
+            lines.append('')
+        return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PinMAME high score leaderboard')
+    parser.add_argument('--top', type=int, default=10, metavar='K',
+                        help='number of scores in each table (default is 10)')
+    parser.add_argument('--by', choices=['rom', 'map'], default='rom',
+                        help='rank each ROM separately, or all ROMs sharing a map')
+    parser.add_argument('--watch', metavar='DIR',
+                        help='after loading <nvram>, reprint the tables as .nv files in DIR change')
+    parser.add_argument('--poll', type=float, metavar='SECONDS',
+                        help='with --watch, poll for changes instead of using inotify')
+    parser.add_argument('nvram', nargs='*', help='.nv files to load')
+    args = parser.parse_args()
+
+    board = Leaderboard(args.top, args.by)
+
+    # start watching before loading the files, so changes made while loading
+    # them aren't missed
+    changes = None
+    if args.watch:
+        if args.poll is None:
+            changes = nvram_parser.inotify_changes(args.watch)
+        if changes is None:
+            changes = nvram_parser.poll_changes(args.watch, args.poll or 1.0)
+
+    for nvpath in args.nvram:
+        try:
+            if not board.update_file(nvpath):
+                print("Couldn't find a map for %s" % os.path.basename(nvpath))
+        except OSError as e:
+            print('Skipping %s: %s' % (nvpath, e), file=sys.stderr)
+    print(board.format(), flush=True)
+
+    if changes is not None:
+        try:
+            for nvpath in changes:
+                try:
+                    if board.update_file(nvpath):
+                        print(board.format(), flush=True)
+                except OSError as e:
+                    # file removed or replaced while reading it
+                    print('Skipping %s: %s' % (nvpath, e), file=sys.stderr)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
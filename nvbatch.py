@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""
+Batch decoder for many .nv files from the same ROM, using NumPy.
+
+Stacks N nvram images into an (N, size) array of bytes, and decodes each of
+the map's bcd, int, bits, enum and dipsw entries for all N images at once.
+Other encodings (ch, raw, wpc_rtc) and high score records are skipped; use
+ParseNVRAM for those.
+
+Also verifies and repairs checksum8 and checksum16 ranges for the whole batch,
+and computes fleet statistics (totals, means, percentiles) of audits, grouped
+by ROM, map or site tag.
+"""
+import sys
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+import nvram_parser
+from nvram_parser import ChecksumFailure, Nibble, ParseNVRAM, RamMapping, to_int
+
+VECTOR_ENCODINGS = ['bcd', 'int', 'bits', 'enum', 'dipsw']
+
+# largest field (in bytes) that fits in an int64 for each encoding; wider
+# fields fall back on an array of Python ints
+MAX_INT64_BYTES = {'bcd': 9, 'int': 7}
+
+# percentiles reported by aggregate()
+PERCENTILES = [50, 90, 99]
+
+BCD_TABLE = np.frombuffer(nvram_parser.BCD_TABLE, dtype=np.uint8).astype(np.int64)
+
+
+def stack(images: Iterable[Union[bytes, bytearray]]) -> np.ndarray:
+    """
+    Combine the contents of multiple .nv files into a single array.
+    :param images: contents of .nv files, all the same size
+    :return: (N, size) array of uint8
+    """
+    rows = [np.frombuffer(image, dtype=np.uint8) for image in images]
+    if not rows:
+        raise ValueError('No nvram images to stack')
+    size = len(rows[0])
+    for row in rows:
+        if len(row) != size:
+            raise ValueError('nvram images differ in size (%u != %u bytes)' % (len(row), size))
+    return np.stack(rows)
+
+
+def load_files(nvram_paths: Iterable[str]) -> np.ndarray:
+    """Read and stack() a list of .nv files."""
+    images = []
+    for path in nvram_paths:
+        with open(path, 'rb') as f:
+            images.append(f.read())
+    return stack(images)
+
+
+def combine(digits: np.ndarray, base: int, wide: bool) -> np.ndarray:
+    """
+    Combine columns of <digits> (most significant first) into a single value per row.
+    :param wide: Set to True if the result might not fit in an int64.
+    """
+    if wide:
+        digits = digits.astype(object)
+        value = np.zeros(len(digits), dtype=object)
+    else:
+        digits = digits.astype(np.int64)
+        value = np.zeros(len(digits), dtype=np.int64)
+    for column in range(digits.shape[1]):
+        value = value * base + digits[:, column]
+    return value
+
+
+class BatchDecoder(object):
+    """
+    Decoder for a map shared by a batch of .nv files.  Create it from a ParseNVRAM
+    object with a map loaded, for example ParseNVRAM(nv_json) or ParseNVRAM(None)
+    followed by load_map().
+    """
+    def __init__(self, parser: ParseNVRAM):
+        self.parser = parser
+        nvram_area = parser.get_memory_area(mem_type='nvram')
+        self.base = nvram_area['address']
+        self.size = nvram_area['size']
+
+        # entries to decode, keyed by RamMapping.path() with a "#n" suffix for duplicates
+        self.fields: Dict[str, RamMapping] = {}
+        for m in parser.mapping:
+            try:
+                if m.sub_entry or m.plan().encoding not in VECTOR_ENCODINGS:
+                    continue
+            except nvram_parser.PLAN_ERRORS as e:
+                print('Skipping %s: %s' % (m.path(), e), file=sys.stderr)
+                continue
+            name = m.path()
+            count = 1
+            while name in self.fields:
+                count += 1
+                name = '%s#%u' % (m.path(), count)
+            self.fields[name] = m
+
+    def get_bytes(self, data: np.ndarray, mapping: RamMapping) -> Optional[np.ndarray]:
+        """
+        Batch equivalent of RamMapping.get_bytes() for entries other than dipsw.
+        :param data: (N, size) array from stack()
+        :return: (N, bytes) array of uint8, or None if <data> doesn't cover the entry
+        """
+        plan = mapping.plan()
+        columns = np.asarray(plan.offsets, dtype=np.intp) - self.base
+        if not len(columns) or columns.min() < 0 \
+                or columns.max() >= min(self.size, data.shape[1]):
+            return None
+
+        ba = data[:, columns]
+        if plan.reverse:
+            ba = ba[:, ::-1]
+
+        if plan.nibble != Nibble.BOTH:
+            if plan.nibble == Nibble.LOW:
+                nibbles = ba & 0x0F
+            else:
+                nibbles = ba >> 4
+            if nibbles.shape[1] % 2:
+                # odd count, so the first nibble is a byte on its own
+                padding = np.zeros((len(nibbles), 1), dtype=np.uint8)
+                nibbles = np.concatenate([padding, nibbles], axis=1)
+            ba = (nibbles[:, 0::2] << 4) | nibbles[:, 1::2]
+
+        if plan.mask is not None:
+            ba = ba & np.uint8(plan.mask & 0xFF)
+
+        return ba
+
+    def dipsw_value(self, data: np.ndarray, mapping: RamMapping) -> Optional[np.ndarray]:
+        """Batch equivalent of RamMapping.get_value() for dipsw entries."""
+        if data.shape[1] <= self.size:
+            # no PinMAME data after the nvram area
+            return None
+        value = np.zeros(len(data), dtype=np.int64)
+        for bit in mapping.plan().offsets:
+            index = bit - 1  # switches start at 1 in file, 0 in memory
+            # dip switches are last 6 bytes of file
+            column = data[:, data.shape[1] - 6 + index // 8]
+            value = (value << 1) | ((column >> (index % 8)) & 1)
+        return value
+
+    def get_value(self, data: np.ndarray, mapping: RamMapping) -> Optional[np.ndarray]:
+        """
+        Batch equivalent of RamMapping.get_value(), returning one value per row of <data>.
+        Values for bits entries are the raw bit field, and values for enum and dipsw
+        entries are indexes into RamMapping.entry_values().
+        """
+        plan = mapping.plan()
+        if plan.encoding == 'dipsw':
+            value = self.dipsw_value(data, mapping)
+            if value is None:
+                return None
+        else:
+            ba = self.get_bytes(data, mapping)
+            if ba is None:
+                return None
+            width = ba.shape[1]
+            if plan.encoding == 'enum':
+                value = ba[:, 0].astype(np.int64)
+            elif plan.encoding == 'bcd':
+                value = combine(BCD_TABLE[ba], 100, width > MAX_INT64_BYTES['bcd'])
+            else:
+                value = combine(ba, 256, width > MAX_INT64_BYTES['int'])
+
+        return value * plan.scale + plan.offset
+
+    def decode(self, data: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Decode all supported entries for a batch of nvram images.
+        :param data: (N, size) array from stack() or load_files()
+        :return: dictionary of N-element arrays keyed by field name (see self.fields);
+                 entries not covered by <data> are left out
+        """
+        if data.ndim != 2:
+            raise ValueError('Expected an (N, size) array of nvram images')
+        columns = {}
+        for name, mapping in self.fields.items():
+            value = self.get_value(data, mapping)
+            if value is not None:
+                columns[name] = value
+        return columns
+
+    def audit_fields(self, audits: Iterable[str]) -> Dict[str, str]:
+        """
+        Find the numeric (bcd or int) audits matching a list of names.
+
+        :param audits: audit labels (e.g., "Games Started") or keys, or selector
+                       patterns (see nvram_parser.Selector) like "audits/*/01"
+        :return: dictionary of field names (see self.fields) keyed by requested name,
+                 using the first matching entry; names without a match are left out
+        """
+        fields = {}
+        for name in audits:
+            pattern = name if '/' in name else 'audits/*/%s' % name
+            selected = set(id(m) for m in self.parser.compile_selector([pattern]).mappings)
+            for field, mapping in self.fields.items():
+                if id(mapping) in selected and mapping.plan().encoding in ['bcd', 'int']:
+                    fields[name] = field
+                    break
+        return fields
+
+    def decode_audits(self, data: np.ndarray, audits: Iterable[str]) -> Dict[str, np.ndarray]:
+        """
+        Decode only the requested audits for a batch of nvram images.
+        :param data: (N, size) array from stack() or load_files()
+        :param audits: see audit_fields()
+        :return: N-element arrays keyed by requested name
+        """
+        columns = {}
+        for name, field in self.audit_fields(audits).items():
+            value = self.get_value(data, self.fields[field])
+            if value is not None:
+                columns[name] = value
+        return columns
+
+    def checksum_failures(self, data: np.ndarray,
+                          fix: bool = False) -> List[Tuple[int, ChecksumFailure]]:
+        """
+        Batch equivalent of ParseNVRAM.checksum_failures().  Each checksum8 range
+        is reshaped into (N, blocks, groupings) to check every block at once.
+
+        :param data: (N, size) array from stack() or load_files()
+        :param fix: Set to True to fix invalid checksums in <data>.
+        :return: list of (row, failure) tuples, where <row> is an index into <data>
+        """
+        failures = []
+        big_endian = self.parser.metadata['big_endian']
+        for entry in self.parser.nv_json.get('checksum16', []):
+            ba = self.get_bytes(data, self.parser.ram_mapping(entry))
+            if ba is None:
+                continue
+            ba = ba.astype(np.int64)
+            if big_endian:
+                stored = ba[:, -1] + ba[:, -2] * 256
+            else:
+                stored = ba[:, -1] * 256 + ba[:, -2]
+            calculated = 0xFFFF - (ba[:, :-2].sum(axis=1) & 0xFFFF)
+            start = to_int(entry['start'])
+            checksum_offset = start + ba.shape[1] - 2
+            bad = calculated != stored
+            for row in np.flatnonzero(bad):
+                failures.append((int(row), ChecksumFailure('checksum16', entry.get('label'),
+                                                           start, checksum_offset + 1,
+                                                           int(calculated[row]),
+                                                           int(stored[row]))))
+            if fix and bad.any():
+                column = checksum_offset - self.base
+                msb = calculated[bad] // 256
+                lsb = calculated[bad] % 256
+                data[bad, column] = msb if big_endian else lsb
+                data[bad, column + 1] = lsb if big_endian else msb
+
+        for entry in self.parser.nv_json.get('checksum8', []):
+            ba = self.get_bytes(data, self.parser.ram_mapping(entry))
+            if ba is None:
+                continue
+            grouping = entry.get('groupings', ba.shape[1])
+            count = ba.shape[1] // grouping
+            blocks = ba[:, :count * grouping].reshape(len(ba), count, grouping).astype(np.int64)
+            calculated = 0xFF - (blocks[:, :, :-1].sum(axis=2) & 0xFF)
+            stored = blocks[:, :, -1]
+            rows, groups = np.nonzero(calculated != stored)
+            start = to_int(entry['start'])
+            for row, group in zip(rows, groups):
+                block_start = start + int(group) * grouping
+                failures.append((int(row), ChecksumFailure('checksum8', entry.get('label'),
+                                                           block_start,
+                                                           block_start + grouping - 1,
+                                                           int(calculated[row, group]),
+                                                           int(stored[row, group]))))
+            if fix and len(rows):
+                columns = start - self.base + groups * grouping + grouping - 1
+                data[rows, columns] = calculated[rows, groups]
+
+        return failures
+
+
+def decode_files(map_path: str, nvram_paths: List[str]) -> Dict[str, np.ndarray]:
+    """
+    Decode a list of .nv files that share a map.
+    :param map_path: path to a map file (typically ending in .nv.json)
+    :param nvram_paths: .nv files, all for ROMs using <map_path>
+    :return: see BatchDecoder.decode()
+    """
+    parser = nvram_parser.ParseNVRAM(None)
+    parser.load_map(map_path)
+    return BatchDecoder(parser).decode(load_files(nvram_paths))
+
+
+def aggregate(columns: Dict[str, np.ndarray], groups: Sequence[Hashable] = None,
+              percentiles: Sequence[float] = PERCENTILES) -> Dict[Hashable, Dict[str, Dict[str, Any]]]:
+    """
+    Compute statistics of each column for each group of rows.  Count, total, min
+    and max use one pass over each column for all groups; percentiles sort each
+    column once by (group, value).
+
+    :param columns: N-element arrays keyed by name, e.g. from BatchDecoder.decode_audits()
+    :param groups: group of each row (e.g., ROM name or site tag), or None for a
+                   single group named None; rows where a column is NaN are skipped
+    :param percentiles: percentiles to report, as keys "p50", "p90", ...
+    :return: {group: {column: {'count', 'total', 'mean', 'min', 'max', 'p50', ...}}}
+    """
+    rows = len(next(iter(columns.values()))) if columns else 0
+    if groups is None:
+        groups = [None] * rows
+    group_ids = {}
+    inverse = np.fromiter((group_ids.setdefault(g, len(group_ids)) for g in groups),
+                          dtype=np.intp, count=len(groups))
+    labels = list(group_ids)
+    result = {label: {} for label in labels}
+
+    for name, values in columns.items():
+        if values.dtype == object:
+            # wider than an int64; statistics are computed on floats instead
+            values = values.astype(np.float64)
+        valid = ~np.isnan(values) if values.dtype.kind == 'f' else np.ones(len(values), bool)
+        ids = inverse[valid]
+        values = values[valid]
+        counts = np.bincount(ids, minlength=len(labels))
+        totals = np.zeros(len(labels), dtype=values.dtype)
+        np.add.at(totals, ids, values)
+        minimums = np.zeros(len(labels), dtype=values.dtype)
+        maximums = np.zeros(len(labels), dtype=values.dtype)
+        order = np.lexsort((values, ids))
+        sorted_values = values[order]
+        ends = np.cumsum(counts)
+        starts = ends - counts
+        has_rows = counts > 0
+        minimums[has_rows] = sorted_values[starts[has_rows]]
+        maximums[has_rows] = sorted_values[ends[has_rows] - 1]
+
+        for index, label in enumerate(labels):
+            count = int(counts[index])
+            stats = {'count': count}
+            if count:
+                group_values = sorted_values[starts[index]:ends[index]]
+                stats.update({
+                    'total': totals[index].item(),
+                    'mean': totals[index].item() / count,
+                    'min': minimums[index].item(),
+                    'max': maximums[index].item(),
+                })
+                for (p, value) in zip(percentiles, np.percentile(group_values, percentiles)):
+                    stats['p%g' % p] = value.item()
+            result[label][name] = stats
+    return result
+
+
+def aggregate_files(nvram_paths: List[str], audits: List[str], group_by: Sequence[str] = ('rom',),
+                    tags: Dict[str, str] = None) -> Dict[Hashable, Dict[str, Dict[str, Any]]]:
+    """
+    Decode audits from .nv files for any number of ROMs, and aggregate() them.
+    Files are stacked and decoded in batches that share a map and file size, so
+    files of a different size (e.g., from another PinMAME version) don't stop the
+    aggregation.  Files that can't be read, or don't have a map, are reported to
+    stderr and skipped.
+
+    :param nvram_paths: .nv files to include
+    :param audits: audit names; see BatchDecoder.audit_fields()
+    :param group_by: any of 'rom', 'map' and 'tag'; groups are named by a tuple of
+                     these values (or the value itself, for a single attribute)
+    :param tags: site tag for each path in <nvram_paths>, for grouping by 'tag'
+    :return: see aggregate(), with statistics keyed by the names in <audits>
+    """
+    tags = tags or {}
+    batches = {}
+    for path in nvram_paths:
+        map_path = nvram_parser.map_for_rom(nvram_parser.rom_for_nvpath(path))
+        if not map_path:
+            print("Skipping %s: couldn't find a map for ROM %s" % (path, nvram_parser.rom_for_nvpath(path)),
+                  file=sys.stderr)
+            continue
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            print('Skipping %s: %s' % (path, e), file=sys.stderr)
+            continue
+        batches.setdefault((map_path, len(data)), []).append((path, data))
+
+    parsers = {}
+    groups = []
+    columns = {name: [] for name in audits}
+    for (map_path, _), batch in batches.items():
+        parser = parsers.get(map_path)
+        if parser is None:
+            parser = parsers[map_path] = nvram_parser.ParseNVRAM(None)
+            parser.load_map(map_path)
+        decoded = BatchDecoder(parser).decode_audits(stack(data for (_, data) in batch), audits)
+        for name in audits:
+            if name in decoded:
+                columns[name].append(decoded[name])
+            else:
+                # NaN marks files whose map doesn't have this audit
+                columns[name].append(np.full(len(batch), np.nan))
+        for (path, _) in batch:
+            attributes = {
+                'rom': nvram_parser.rom_for_nvpath(path),
+                'map': map_path,
+                'tag': tags.get(path),
+            }
+            key = tuple(attributes[attribute] for attribute in group_by)
+            groups.append(key[0] if len(key) == 1 else key)
+
+    return aggregate({name: np.concatenate(parts) for name, parts in columns.items() if parts},
+                     groups)
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+A long-running nvram parser that answers queries over a Unix domain socket,
+for applications (scoreboards, kiosks) that would otherwise run nvram_parser.py
+as a subprocess for each request.
+
+All maps in MAPS_ROOT are loaded and compiled once at startup.  Clients send
+one JSON object per line, and receive one JSON object per line in response.
+A connection can be used for any number of requests, and multiple clients are
+served concurrently.
+
+Requests identify a .nv file with "nvram" (a path in the daemon's --root
+directory, which is the current directory by default) or "data" (the
+base64-encoded contents of the file, along with "nvram" or "rom" to select
+the map).  Optional "map" (a path in --root or MAPS_ROOT) and "rom" keys work
+like the --map and --rom options of nvram_parser.py.
+
+    {"op": "decode", "nvram": "nvram/afm_113.nv"}
+        -> {"ok": true, "records": [{"file": ..., "section": ..., "value": ...}, ...]}
+    {"op": "high_scores", "nvram": "nvram/afm_113.nv"}
+        -> {"ok": true, "high_scores": [...], "mode_champions": [...], "last_played": ...}
+    {"op": "diff", "old": "old/afm_113.nv", "new": "nvram/afm_113.nv"}
+        -> {"ok": true, "changes": [{"label": ..., "old": ..., "new": ...}, ...]}
+    {"op": "ping"}
+        -> {"ok": true, "maps": 123}
+
+Errors are reported as {"ok": false, "error": "..."}.
+
+The socket is created in $XDG_RUNTIME_DIR, or in a directory for the current
+user in the system's temporary directory, and only the owner can connect.
+"""
+import argparse
+import base64
+import copy
+import json
+import os
+import socket
+import socketserver
+import stat
+import sys
+import tempfile
+import threading
+import traceback
+from typing import Optional
+
+import nvram_parser
+from nvram_parser import ParseNVRAM, iter_records, json_value, map_for_rom, rom_for_nvpath
+
+DEFAULT_SOCKET = os.path.join(os.environ.get('XDG_RUNTIME_DIR') or
+                              os.path.join(tempfile.gettempdir(), 'nvdaemon-%u' % os.getuid()),
+                              'nvdaemon.sock')
+
+
+class QueryError(Exception):
+    """A request that can't be answered, reported to the client as an error."""
+
+
+class MapCache(object):
+    """
+    ParseNVRAM objects with compiled maps, keyed by map path.  Each query works on
+    a shallow copy of the shared object with its own SparseMemory, so a map can be
+    used by multiple threads at once.
+    """
+    def __init__(self):
+        self.parsers = {}
+        self.lock = threading.Lock()
+
+    def preload(self) -> None:
+        """Load every map referenced by the index in MAPS_ROOT."""
+        map_paths = set(map_for_rom(rom) for rom in nvram_parser.rom_index.map_files())
+        for map_path in sorted(p for p in map_paths if p):
+            try:
+                self.parser(map_path)
+            except Exception as e:
+                print('Unable to load %s: %s' % (map_path, e), file=sys.stderr)
+
+    def parser(self, map_path: str) -> ParseNVRAM:
+        """Return the shared ParseNVRAM object for <map_path>, loading it if necessary."""
+        p = self.parsers.get(map_path)
+        if p is None:
+            with self.lock:
+                p = self.parsers.get(map_path)
+                if p is None:
+                    p = ParseNVRAM(None)
+                    p.load_map(map_path)
+                    p.address_index()
+                    self.parsers[map_path] = p
+        return p
+
+    def open(self, nvpath: str, map_path: Optional[str], rom: Optional[str],
+             data: bytes) -> ParseNVRAM:
+        """Return a ParseNVRAM object holding <data>, for use by a single query."""
+        if not map_path:
+            map_path = map_for_rom(rom or rom_for_nvpath(nvpath))
+            if not map_path:
+                raise QueryError("Couldn't find a map for %s" % os.path.basename(nvpath))
+        p = copy.copy(self.parser(map_path))
+        p.memory = p.nvram_memory(data)
+        return p
+
+
+def inside(path: str, directory: str) -> bool:
+    """Return True if <path> is <directory> or a file in it, after resolving symlinks."""
+    path = os.path.realpath(path)
+    directory = os.path.realpath(directory)
+    return os.path.commonpath([path, directory]) == directory
+
+
+def socket_directory(socket_path: str) -> None:
+    """
+    Create the directory for <socket_path> (accessible only by the current user)
+    if it doesn't exist, and raise OSError if it exists but other users could
+    replace the socket.
+    """
+    directory = os.path.dirname(os.path.abspath(socket_path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.stat(directory)
+    shared = info.st_mode & (stat.S_IWGRP | stat.S_IWOTH) and not info.st_mode & stat.S_ISVTX
+    if info.st_uid not in [os.getuid(), 0] or shared:
+        raise OSError('Other users can replace files in %s' % directory)
+
+
+def remove_stale_socket(socket_path: str) -> None:
+    """
+    Remove a socket left behind by a daemon that's no longer running.  Raise
+    OSError if <socket_path> isn't a socket, or another daemon is listening on it.
+    """
+    try:
+        mode = os.lstat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise OSError('%s exists and is not a socket' % socket_path)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        try:
+            s.connect(socket_path)
+        except OSError:
+            os.unlink(socket_path)
+            return
+    raise OSError('Another daemon is listening on %s' % socket_path)
+
+
+class QueryHandler(socketserver.StreamRequestHandler):
+    """Answer newline-delimited JSON requests until the client disconnects."""
+    def handle(self) -> None:
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise QueryError('Request must be a JSON object')
+                response = self.server.query(request)
+            except (QueryError, OSError, ValueError, KeyError) as e:
+                response = {'ok': False, 'error': str(e)}
+            except Exception as e:
+                traceback.print_exc()
+                response = {'ok': False, 'error': 'Internal error: %s' % e}
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class NvramDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix domain socket server answering queries with a warm MapCache."""
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, maps: MapCache = None, root: str = None):
+        """
+        :param socket_path: path of the Unix domain socket
+        :param maps: MapCache to use (e.g., after calling its preload() method)
+        :param root: directory holding the files that requests can read (default
+                     is the current directory); relative paths are relative to it
+        """
+        self.maps = maps or MapCache()
+        self.root = os.path.realpath(root or os.getcwd())
+        socket_directory(socket_path)
+        remove_stale_socket(socket_path)
+        super().__init__(socket_path, QueryHandler)
+
+    def server_bind(self) -> None:
+        # create the socket with permissions for the owner only
+        umask = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(umask)
+
+    def request_path(self, request: dict, key: str, maps: bool = False) -> str:
+        """
+        Return the path in <request> under <key>, resolved against self.root.
+        :param maps: Set to True to also allow paths in MAPS_ROOT.
+        """
+        path = request[key]
+        if not isinstance(path, str):
+            raise QueryError('"%s" must be a string' % key)
+        path = os.path.join(self.root, path)
+        if inside(path, self.root) or (maps and inside(path, nvram_parser.MAPS_ROOT)):
+            return path
+        raise QueryError('"%s" is outside of the daemon\'s root directory' % key)
+
+    def read_nvram(self, request: dict, key: str = 'nvram') -> bytes:
+        """Return the .nv contents for a request, from its "data" or <key> path."""
+        if key == 'nvram' and 'data' in request:
+            return base64.b64decode(request['data'])
+        if key not in request:
+            raise QueryError('Missing "%s"' % key)
+        with open(self.request_path(request, key), 'rb') as f:
+            return f.read()
+
+    def query(self, request: dict) -> dict:
+        """Return the response for a single decoded request."""
+        op = request.get('op')
+        map_path = self.request_path(request, 'map', maps=True) if request.get('map') else None
+        rom = request.get('rom')
+
+        if op == 'ping':
+            return {'ok': True, 'maps': len(self.maps.parsers)}
+
+        if op == 'decode':
+            nvpath = request.get('nvram', rom or '')
+            p = self.maps.open(nvpath, map_path, rom, self.read_nvram(request))
+            records = []
+            for record in iter_records(p, nvpath):
+                record['value'] = json_value(record['value'])
+                records.append(record)
+            return {'ok': True, 'records': records}
+
+        if op == 'high_scores':
+            nvpath = request.get('nvram', rom or '')
+            p = self.maps.open(nvpath, map_path, rom, self.read_nvram(request))
+            return {
+                'ok': True,
+                'high_scores': p.high_scores(),
+                'mode_champions': p.high_scores('mode_champions'),
+                'last_played': p.last_played(),
+            }
+
+        if op == 'diff':
+            old = self.read_nvram(request, 'old')
+            new = self.read_nvram(request, 'new')
+            p = self.maps.open(request['new'], map_path, rom, new)
+            return {'ok': True, 'changes': nvram_parser.change_events(request['new'],
+                                                                     p.diff(old, new))}
+
+        raise QueryError('Unknown op %r' % op)
+
+
+def query(request: dict, socket_path: str = DEFAULT_SOCKET) -> dict:
+    """Send a single request to a running daemon and return its response."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(socket_path)
+        s.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        with s.makefile('rb') as f:
+            return json.loads(f.readline())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PinMAME nvram parser daemon')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET,
+                        help='path of the Unix domain socket (default is %s)' % DEFAULT_SOCKET)
+    parser.add_argument('--root', metavar='DIR',
+                        help='only read .nv files (and maps outside of MAPS_ROOT) in DIR; '
+                             'default is the current directory')
+    parser.add_argument('--no-preload', action='store_true',
+                        help='load maps on first use instead of at startup')
+    args = parser.parse_args()
+
+    maps = MapCache()
+    if not args.no_preload:
+        maps.preload()
+        print('Loaded %u maps' % len(maps.parsers), flush=True)
+
+    with NvramDaemon(args.socket, maps, args.root) as server:
+        print('Listening on %s' % args.socket, flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(args.socket)
+
+
+if __name__ == '__main__':
+    main()
@@ -12,7 +12,6 @@ TODO:
     - have separate mapping for initials and score
 """
 import argparse
-import json
 
 from nvram_parser import ParseNVRAM, rom_for_nvpath, map_for_rom
 
@@ -36,13 +35,9 @@ def main():
             print("Couldn't find a map for %s" % args.filename)
             return
 
-    with open(args.map, 'r') as f:
-        nv_map = json.load(f)
-
-    with open(args.filename, 'rb') as f:
-        nv = bytearray(f.read())
-
-    parser = ParseNVRAM(nv_map, nv)
+    parser = ParseNVRAM(None)
+    parser.load_map(args.map)
+    parser.load_nvram(args.filename)
 
     print('dumping %s' % args.filename)
 
@@ -20,17 +20,49 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-import argparse
+# Modules used only by some commands (argparse, csv, glob, concurrent.futures,
+# archive and mmap support) are imported where they're used, to keep startup fast.
+import bisect
+import hashlib
+import io
 import json
+import marshal
 import os
+import sys
 
-from curses.ascii import isprint
 from datetime import datetime
 from enum import Enum
-from typing import Any, List, Optional, Tuple, Union
+from typing import Any, Iterable, Iterator, List, NamedTuple, Optional, TextIO, Tuple, Union
 
-MAPS_ROOT = os.path.join(os.path.dirname(__file__), 'maps')
+# set NVRAM_MAPS_ROOT to use maps from another directory (e.g., test/fixtures/maps)
+MAPS_ROOT = os.environ.get('NVRAM_MAPS_ROOT', os.path.join(os.path.dirname(__file__), 'maps'))
 HEX_DUMP_BYTES_PER_LINE = 16
+# maximum number of .nv files in each task of a --batch job
+BATCH_CHUNK_SIZE = 16
+# output formats for --format, and columns of records for ndjson and csv
+OUTPUT_FORMATS = ['text', 'ndjson', 'csv']
+RECORD_FIELDS = ['file', 'rom', 'section', 'group', 'key', 'label', 'value']
+# block size used when searching for changed bytes between two snapshots
+DIFF_BLOCK_SIZE = 64
+# gaps of up to this many bytes between needed ranges are read instead of
+# issuing a separate read (see coalesce_ranges())
+COALESCE_GAP = 32
+# archives of .nv files accepted by --batch (see iter_archive())
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2',
+                      '.tar.xz', '.txz', '.nv.gz')
+
+# Directory for compiled maps, disabled unless NVRAM_MAP_CACHE is set.  Use a
+# directory that only you can write to (e.g., ~/.cache/pinmame-nvmaps).
+CACHE_ROOT = os.environ.get('NVRAM_MAP_CACHE', '')
+# Increment when changes to RamMapping or ParseNVRAM invalidate compiled maps.
+COMPILED_MAP_VERSION = 5
+
+# decimal value of each BCD byte, with nibbles 0xA to 0xF treated as 0 (see RamMapping.bcd())
+BCD_TABLE = bytes((b >> 4 if b >> 4 < 10 else 0) * 10 + (b & 0x0F if b & 0x0F < 10 else 0)
+                  for b in range(256))
+# hex digit (as ASCII) for the low or high nibble of each byte, to pack with bytearray.fromhex()
+LOW_NIBBLE_HEX = bytes(ord('%x' % (b & 0x0F)) for b in range(256))
+HIGH_NIBBLE_HEX = bytes(ord('%x' % (b >> 4)) for b in range(256))
 
 class Nibble(Enum):
     BOTH = 0
@@ -38,6 +70,10 @@ class Nibble(Enum):
     HIGH = 2
 
 
+# Nibble members indexed by value, for MappingPlan.from_cache()
+NIBBLES = tuple(Nibble)
+
+
 def get_nibble(value: Optional[str]) -> Nibble:
     if value is None or value == 'both':
         return Nibble.BOTH
@@ -66,20 +102,138 @@ def format_number(number: int) -> str:
     return '{0:,}'.format(number)
 
 
+def save_cache(cache_path: str, data: Any) -> None:
+    """
+    Atomically write <data> (plain values supported by marshal) to <cache_path>
+    in CACHE_ROOT.  Failures are ignored, since cached files are only an optimization.
+    """
+    temp_path = '%s.%u' % (cache_path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(cache_path), mode=0o700, exist_ok=True)
+        with open(temp_path, 'wb') as f:
+            marshal.dump(data, f)
+        os.replace(temp_path, cache_path)
+    except (OSError, ValueError):
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+
+def file_digest(path: str) -> Optional[str]:
+    """Return a SHA-1 hex digest of a file's contents, or None if it can't be read."""
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def platform_path(platform_name: str) -> str:
+    """Return full path to the JSON file for a platform (e.g., wpc)."""
+    return os.path.join(MAPS_ROOT, 'platforms', platform_name + '.json')
+
+
+class RomIndex(object):
+    """
+    Memoized lookups from the index.json and romnames.json files in MAPS_ROOT.
+    Both files are loaded on first use and reloaded if either one's modification
+    time changes.  If CACHE_ROOT is set, the combined index is also saved there, so a new process
+    can load it with a single read instead of parsing both JSON files.
+    """
+    def __init__(self, maps_root: Optional[str] = None):
+        """
+        :param maps_root: directory containing index.json and romnames.json,
+                          or None to use MAPS_ROOT at the time of each lookup
+        """
+        self.maps_root = maps_root
+        self.stamp = None
+        self.maps = {}
+        self.titles = {}
+        self.roms = {}
+
+    def refresh(self) -> None:
+        """Load index.json and romnames.json if they've changed since the last call."""
+        root = self.maps_root or MAPS_ROOT
+        index_path = os.path.join(root, 'index.json')
+        names_path = os.path.join(root, 'romnames.json')
+        stamp = (root, os.stat(index_path).st_mtime_ns, os.stat(names_path).st_mtime_ns)
+        if stamp == self.stamp:
+            return
+
+        cache_path = None
+        if CACHE_ROOT:
+            cache_path = os.path.join(CACHE_ROOT, 'index-%s.v%u.marshal' %
+                                      (hashlib.sha1(os.fsencode(root)).hexdigest()[:16],
+                                       COMPILED_MAP_VERSION))
+            try:
+                with open(cache_path, 'rb') as f:
+                    cached = marshal.loads(f.read())
+                (maps, titles, roms) = cached['index']
+                if cached['stamp'] == stamp and all(isinstance(d, dict) for d in (maps, titles, roms)):
+                    (self.maps, self.titles, self.roms) = (maps, titles, roms)
+                    self.stamp = stamp
+                    return
+            except (OSError, EOFError, KeyError, TypeError, ValueError):
+                pass
+
+        with open(index_path) as f:
+            index = json.load(f)
+        with open(names_path) as f:
+            self.titles = json.load(f)
+        self.maps = {}
+        self.roms = {}
+        for rom, map_file in index.items():
+            if rom.startswith('_'):
+                # skip over _note entry
+                continue
+            self.maps[rom] = map_file
+            self.roms.setdefault(map_file, []).append(rom)
+        self.stamp = stamp
+        if cache_path:
+            save_cache(cache_path, {'stamp': stamp,
+                                    'index': (self.maps, self.titles, self.roms)})
+
+    def map_files(self) -> dict:
+        """Return a dictionary of map files (relative to MAPS_ROOT) keyed by ROM name."""
+        self.refresh()
+        return self.maps
+
+    def map_for_rom(self, rom: str) -> Optional[str]:
+        """Return full path to the mapfile for a given rom, or None if it isn't supported."""
+        self.refresh()
+        map_file = self.maps.get(rom)
+        if map_file:
+            return os.path.join(self.maps_root or MAPS_ROOT, map_file)
+        return None
+
+    def rom_name(self, rom: str) -> str:
+        """Return the descriptive ROM name for a given ROM (e.g., fh_l9)."""
+        self.refresh()
+        return self.titles.get(rom, '(Unknown ROM %s)' % rom)
+
+    def roms_for_map(self, map_file: str) -> List[str]:
+        """
+        Return the list of ROMs using a given map.
+        :param map_file: full path to a map, or a path relative to MAPS_ROOT
+        """
+        self.refresh()
+        root = self.maps_root or MAPS_ROOT
+        return self.roms.get(os.path.relpath(os.path.join(root, map_file), root), [])
+
+
+# shared by all callers in this process
+rom_index = RomIndex()
+
+
 def rom_name(rom: str) -> str:
     """Return the descriptive ROM name for a given ROM (e.g., fh_l9)."""
-    with open(os.path.join(MAPS_ROOT, 'romnames.json')) as f:
-        return json.load(f).get(rom, '(Unknown ROM %s)' % rom)
+    return rom_index.rom_name(rom)
 
 
 def map_for_rom(rom: str) -> Optional[str]:
     """Return full path to the mapfile for a given rom, or None if it isn't supported."""
-    with open(os.path.join(MAPS_ROOT, 'index.json')) as f:
-        map_file = json.load(f).get(rom)
-        if map_file:
-            return os.path.join(MAPS_ROOT, map_file)
-
-    return None
+    return rom_index.map_for_rom(rom)
 
 
 def rom_for_nvpath(nvpath: str) -> str:
@@ -138,19 +292,74 @@ def dipsw_set(nvram: bytes, index: int, state: bool) -> None:
         nvram[-6 + bank] &= ~mask
 
 
+def changed_ranges(old: bytes, new: bytes) -> List[Tuple[int, int]]:
+    """
+    Compare two buffers and return a list of (start, end) offsets (end is exclusive)
+    for each run of changed bytes.  If the lengths differ, bytes past the end of the
+    shorter buffer are treated as changed.
+    """
+    ranges = []
+    length = min(len(old), len(new))
+    run_start = None
+    for block in range(0, length, DIFF_BLOCK_SIZE):
+        block_end = min(block + DIFF_BLOCK_SIZE, length)
+        if old[block:block_end] == new[block:block_end]:
+            if run_start is not None:
+                ranges.append((run_start, block))
+                run_start = None
+            continue
+        for offset in range(block, block_end):
+            if old[offset] != new[offset]:
+                if run_start is None:
+                    run_start = offset
+            elif run_start is not None:
+                ranges.append((run_start, offset))
+                run_start = None
+    if run_start is not None:
+        ranges.append((run_start, length))
+    if len(old) != len(new):
+        if ranges and ranges[-1][1] == length:
+            ranges[-1] = (ranges[-1][0], max(len(old), len(new)))
+        else:
+            ranges.append((length, max(len(old), len(new))))
+    return ranges
+
+
+def coalesce_ranges(offsets: Iterable[int], gap: int = COALESCE_GAP) -> List[Tuple[int, int]]:
+    """
+    Return the fewest (start, end) ranges (end is exclusive) covering <offsets>,
+    merging ranges separated by <gap> bytes or less.
+    """
+    ranges = []
+    for offset in sorted(set(offsets)):
+        if ranges and offset <= ranges[-1][1] + gap:
+            ranges[-1][1] = offset + 1
+        else:
+            ranges.append([offset, offset + 1])
+    return [(start, end) for (start, end) in ranges]
+
+
 class SparseMemory(object):
     """
     Object representing memory contents for a portion of the full address space.
     """
     def __init__(self):
         self.pinmame_data = None
+        # regions sorted by address, and a parallel list of base addresses for bisect
         self.memory = []
+        self.bases = []
+        # memory-mapped file and a view of it, set by map_file()
+        self.mapped = None
+        self.mapped_view = None
+        # region holding the start of the mapped file, and that region's size
+        self.mapped_region = None
+        self.mapped_length = 0
 
     def find_region(self, address: int) -> Optional[dict]:
-        for region in self.memory:
-            region_base = region['base_address']
-            region_size = len(region['data'])
-            if region_base <= address < region_base + region_size:
+        index = bisect.bisect_right(self.bases, address) - 1
+        if index >= 0:
+            region = self.memory[index]
+            if address < region['base_address'] + len(region['data']):
                 return region
         return None
 
@@ -169,7 +378,9 @@ class SparseMemory(object):
             region['data'][offset:offset + data_size] = data
         else:
             # new memory region
-            self.memory.append({
+            index = bisect.bisect_right(self.bases, address)
+            self.bases.insert(index, address)
+            self.memory.insert(index, {
                 'base_address': address,
                 'data': data
             })
@@ -180,11 +391,27 @@ class SparseMemory(object):
         :param address: address for lookup
         :return: value of byte at address or None
         """
-        for region in self.memory:
-            region_base = region['base_address']
-            region_size = len(region['data'])
-            if region_base <= address < region_base + region_size:
-                return region['data'][address - region_base]
+        index = bisect.bisect_right(self.bases, address) - 1
+        if index >= 0:
+            region = self.memory[index]
+            offset = address - region['base_address']
+            if offset < len(region['data']):
+                return region['data'][offset]
+        return None
+
+    def read(self, address: int, length: int) -> Optional[memoryview]:
+        """
+        Return a view of <length> bytes starting at <address> without copying them.
+        :param address: address of first byte
+        :param length: number of bytes
+        :return: memoryview of the bytes, or None if they aren't all in a single region
+        """
+        index = bisect.bisect_right(self.bases, address) - 1
+        if index >= 0:
+            region = self.memory[index]
+            offset = address - region['base_address']
+            if offset + length <= len(region['data']):
+                return memoryview(region['data'])[offset:offset + length]
         return None
 
     def set_pinmame_data(self, data: bytearray = None):
@@ -193,6 +420,83 @@ class SparseMemory(object):
     def get_pinmame_data(self) -> Optional[bytearray]:
         return self.pinmame_data
 
+    def map_file(self, path: str, writable: bool = False, address: int = 0,
+                 length: int = None) -> memoryview:
+        """
+        Memory-map a file to use as the backing store for this object, replacing
+        any existing regions and PinMAME data.  The first <length> bytes of the
+        file become the region at <address>, and the rest become the PinMAME data.
+
+        :param path: file to map
+        :param writable: Set to True to have update_memory() and changes to the
+                         PinMAME data modify the file itself (see flush()).
+        :param address: address of the file's first byte
+        :param length: size of the region (e.g., the platform's nvram size); default
+                       is the entire file
+        :return: view of the entire file
+        """
+        import mmap
+
+        self.close()
+        self.memory = []
+        self.bases = []
+        self.pinmame_data = None
+        with open(path, 'r+b' if writable else 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                # mmap can't map an empty file
+                self.update_memory(address, bytearray())
+                return memoryview(bytearray())
+            self.mapped = mmap.mmap(f.fileno(), 0,
+                                    access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        self.mapped_view = memoryview(self.mapped)
+        self.mapped_length = min(len(self.mapped), len(self.mapped) if length is None else length)
+        self.update_memory(address, self.mapped_view[:self.mapped_length])
+        self.mapped_region = self.memory[0]
+        if self.mapped_length < len(self.mapped):
+            self.set_pinmame_data(self.mapped_view[self.mapped_length:])
+        return self.mapped_view
+
+    def flush(self) -> None:
+        """Write changes to a file mapped with map_file(writable=True) to disk."""
+        if self.mapped is not None:
+            self.mapped.flush()
+
+    def close(self) -> None:
+        """
+        Release a file mapped with map_file(), along with the regions using it.
+        Raises BufferError, leaving the file mapped and this object unchanged, if
+        views returned by read() (or views made from them) are still in use.
+        """
+        if self.mapped is None:
+            return
+        pinmame_mapped = (isinstance(self.pinmame_data, memoryview)
+                          and self.pinmame_data.obj is self.mapped)
+        # views of the file held by this object; the file can only be closed
+        # once every view of it is released
+        self.mapped_region['data'].release()
+        if pinmame_mapped:
+            self.pinmame_data.release()
+        self.mapped_view.release()
+        try:
+            self.mapped.close()
+        except BufferError:
+            # another view of the file is still in use; restore this object's views
+            self.mapped_view = memoryview(self.mapped)
+            self.mapped_region['data'] = self.mapped_view[:self.mapped_length]
+            if pinmame_mapped:
+                self.pinmame_data = self.mapped_view[self.mapped_length:]
+            raise
+
+        index = self.bases.index(self.mapped_region['base_address'])
+        del self.memory[index]
+        del self.bases[index]
+        if pinmame_mapped:
+            self.pinmame_data = None
+        self.mapped = None
+        self.mapped_view = None
+        self.mapped_region = None
+        self.mapped_length = 0
+
 
 class ChecksumMapping(object):
     """Simplified RamMapping object used for checksum values."""
@@ -228,6 +532,38 @@ class ChecksumMapping(object):
         return label, value
 
 
+class MappingPlan(NamedTuple):
+    """
+    Byte addresses and decoding options of a RamMapping, resolved from its entry
+    and the platform's memory layout once instead of on every access.
+    """
+    offsets: Tuple[int, ...]
+    start: Optional[int]  # first offset if offsets are sequential, otherwise None
+    encoding: Optional[str]
+    nibble: Nibble
+    little_endian: bool
+    reverse: bool  # reverse bytes of a little-endian integer encoding
+    mask: Optional[int]
+    scale: Union[int, float]
+    offset: int
+
+    def to_cache(self) -> tuple:
+        """Return this plan as a tuple of plain values, for save_compiled_map()."""
+        return self._replace(nibble=self.nibble.value)[:]
+
+    @classmethod
+    def from_cache(cls, data: tuple) -> 'MappingPlan':
+        """Rebuild a plan saved with to_cache(), raising ValueError if it's malformed."""
+        if type(data) is not tuple or len(data) != len(cls._fields) or type(data[0]) is not tuple:
+            raise ValueError('invalid MappingPlan')
+        # skip NamedTuple's argument handling, since this runs for every entry of a compiled map
+        return tuple.__new__(cls, data[:3] + (NIBBLES[data[3]],) + data[4:])
+
+
+# exceptions raised by RamMapping.plan() for a malformed entry
+PLAN_ERRORS = (AssertionError, IndexError, KeyError, TypeError, ValueError)
+
+
 class RamMapping(object):
     """Object representing a single entry from a nvram mapping file."""
     def __init__(self,
@@ -252,6 +588,7 @@ class RamMapping(object):
         for sub in ['initials', 'score', 'timestamp']:
             if sub in entry:
                 self.sub_entry[sub] = RamMapping(entry[sub], metadata)
+        self._plan = None
 
     def nvram_base_address(self) -> int:
         """
@@ -264,8 +601,40 @@ class RamMapping(object):
                 return region['address']
         return 0
 
+    def plan(self) -> MappingPlan:
+        """Return the MappingPlan for this entry, resolving it on first use."""
+        if self._plan is None:
+            self._plan = self.compile_plan()
+        return self._plan
+
+    def compile_plan(self) -> MappingPlan:
+        """Resolve this entry's attributes and platform defaults into a MappingPlan."""
+        offsets = tuple(self.entry_offsets())
+        start = None
+        if offsets and offsets == tuple(range(offsets[0], offsets[0] + len(offsets))):
+            start = offsets[0]
+        encoding = self.entry.get('encoding')
+        little_endian = self.entry_little_endian()
+        mask = self.entry.get('mask')
+        scale = self.entry.get('scale', 1)
+        if type(scale) is not float:
+            scale = to_int(scale)
+        return MappingPlan(offsets=offsets,
+                           start=start,
+                           encoding=encoding,
+                           nibble=self.entry_nibble(offsets),
+                           little_endian=little_endian,
+                           reverse=little_endian and encoding in ['bcd', 'int', 'bits'],
+                           mask=None if mask is None else to_int(mask),
+                           scale=scale,
+                           offset=to_int(self.entry.get('offset', 0)))
+
     def offsets(self) -> List[int]:
         """Return a list of byte offsets based on the start/end/length/offsets attributes."""
+        return list(self.plan().offsets)
+
+    def entry_offsets(self) -> List[int]:
+        """Calculate offsets() from the entry's start/end/length/offsets attributes."""
         if self.sub_entry:
             # special-case handling for high score or other combined records
             o = []
@@ -305,8 +674,15 @@ class RamMapping(object):
             - the single byte at 'start' if 'end' and 'length' are not specified
             - bytes from offsets in a list called 'offsets'
         """
+        plan = self.plan()
+        if plan.start is not None:
+            data = memory.read(plan.start, len(plan.offsets))
+            if data is not None:
+                return bytearray(data)
+
+        # scattered offsets, or a range spanning multiple regions
         result = bytearray()
-        for offset in self.offsets():
+        for offset in plan.offsets:
             byte = memory.get_byte(offset)
             if byte is None:
                 return None
@@ -321,8 +697,9 @@ class RamMapping(object):
         - combines nibbles into complete bytes
         - if appropriate, applies a mask to each byte
         """
-        encoding = self.entry.get('encoding')
-        
+        plan = self.plan()
+        encoding = plan.encoding
+
         # special case handling for dip switches
         if encoding == 'dipsw':
             value = 0
@@ -330,7 +707,7 @@ class RamMapping(object):
             if not pinmame_data:
                 # didn't load from a PinMAME .nv file
                 return None
-            for bit in self.offsets():
+            for bit in plan.offsets:
                 # shift current value one bit left and set LSB
                 value = (value << 1) + dipsw_get(pinmame_data, bit)
             # might need to split into multiple list entries if value > 255
@@ -341,30 +718,20 @@ class RamMapping(object):
             return None
 
         # convert certain byte sequences from little_endian to big endian
-        if self.little_endian() and encoding in ['bcd', 'int', 'bits']:
+        if plan.reverse:
             ba.reverse()
 
-        # find the nibble setting for the first address of this entry
-        nibble = self.nibble()
+        # nibble setting for the first address of this entry
+        nibble = plan.nibble
         if nibble != Nibble.BOTH:
-            # combine nibbles of ba
-            new_ba = bytearray()
-            value = 0
-            while ba:
-                b = ba.pop(0)
-                if nibble == Nibble.LOW:
-                    b = b & 0x0F
-                else:
-                    b = b >> 4
-                value = (value << 4) + b
-                if len(ba) % 2 == 0:
-                    # if remaining byte count is even, save new value
-                    new_ba.append(value)
-                    value = 0
-            ba = new_ba
-
-        if 'mask' in self.entry:
-            mask = to_int(self.entry['mask'])
+            # combine nibbles of ba, with the first nibble on its own if count is odd
+            digits = ba.translate(LOW_NIBBLE_HEX if nibble == Nibble.LOW else HIGH_NIBBLE_HEX)
+            if len(digits) % 2:
+                digits = b'0' + digits
+            ba = bytearray.fromhex(digits.decode('ascii'))
+
+        mask = plan.mask
+        if mask is not None:
             ba = bytearray(map((lambda x: x & mask), ba))
 
         return ba
@@ -381,6 +748,10 @@ class RamMapping(object):
         """Return Nibble.BOTH, Nibble.LOW, or Nibble.HIGH based on `nibble`
         attribute or the deprecated `packed` attribute.
         """
+        return self.plan().nibble
+
+    def entry_nibble(self, offsets: Tuple[int, ...]) -> Nibble:
+        """Calculate nibble() from the entry and the platform's memory layout."""
         if not self.entry.get('packed', True):
             # if entry has 'packed=false', replace file's default with 'nibble=low'
             return Nibble.LOW
@@ -390,7 +761,7 @@ class RamMapping(object):
             return get_nibble(entry_nibble)
 
         # use the memory region's `nibble` setting
-        address = self.offsets()[0]
+        address = offsets[0]
         for region in self.metadata['platform']['memory_layout']:
             region_start = region['address']
             region_end = region_start + region['size'] - 1
@@ -402,6 +773,10 @@ class RamMapping(object):
 
     def little_endian(self) -> bool:
         """Return True if this entry is little endian (LSB first)."""
+        return self.plan().little_endian
+
+    def entry_little_endian(self) -> bool:
+        """Calculate little_endian() from the entry and the map's default."""
         default = 'big' if self.metadata['big_endian'] else 'little'
         return self.entry.get('endian', default) == 'little'
 
@@ -412,33 +787,33 @@ class RamMapping(object):
         single-byte enumerated (enum) values.  Returns None for unsupported
         encodings or mappings that aren't covered by <memory>.
         """
-        value = None
-        if 'encoding' in self.entry:
-            encoding = self.entry['encoding']
-            ba = self.get_bytes(memory)
-            if ba is None:
-                return None
+        if self.plan().encoding is None:
+            return None
+        ba = self.get_bytes(memory)
+        if ba is None:
+            return None
+        return self.integer_value(ba)
 
-            if encoding == 'bcd':
-                value = 0
-                for b in ba:
-                    value = value * 100 + self.bcd(b >> 4) * 10 + self.bcd(b & 0x0F)
-            elif encoding in ['int', 'bits', 'dipsw']:
-                value = 0
-                for b in ba:
-                    value = value * 256 + b
-            elif encoding == 'enum':
-                value = ba[0]
-
-            if value is not None:
-                scale = self.entry.get('scale', 1)
-                if type(scale) is float:
-                    value *= scale
-                else:
-                    value *= to_int(scale)
-                value += to_int(self.entry.get('offset', 0))
+    def integer_value(self, ba: bytearray) -> Optional[Union[int, float]]:
+        """Convert bytes from get_bytes() to get_value()'s result, applying the
+        entry's scale and offset.
+        """
+        plan = self.plan()
+        encoding = plan.encoding
+        if encoding == 'bcd':
+            value = 0
+            for b in ba:
+                value = value * 100 + BCD_TABLE[b]
+        elif encoding in ['int', 'bits', 'dipsw']:
+            value = 0
+            for b in ba:
+                value = value * 256 + b
+        elif encoding == 'enum':
+            value = ba[0]
+        else:
+            return None
 
-        return value
+        return value * plan.scale + plan.offset
 
     def set_value(self, memory: SparseMemory,
                   value: Union[int, str, datetime]) -> None:
@@ -460,7 +835,7 @@ class RamMapping(object):
             pinmame_data = memory.get_pinmame_data()
             if pinmame_data:
                 # use reversed() to start with LSB in list of offsets
-                for bit in reversed(self.offsets()):
+                for bit in reversed(self.plan().offsets):
                     dipsw_set(pinmame_data, bit, bool(value & 1))
                     value >>= 1
             return
@@ -497,7 +872,7 @@ class RamMapping(object):
                     new_bytes.append(b)
                     value //= 256
 
-            if not self.little_endian():
+            if not self.plan().little_endian:
                 new_bytes = reversed(new_bytes)
         else:
             raise ValueError('Unsupported encoding %s' % encoding)
@@ -534,35 +909,56 @@ class RamMapping(object):
             values = self.metadata['values'].get(values, [])
         return values
 
-    def format_entry(self, memory: SparseMemory) -> Optional[str]:
-        """Format bytes from 'memory' for this entry."""
-        if self.entry is None:
-            return None
-        if 'initials' in self.sub_entry or 'score' in self.sub_entry:
-            return self.format_high_score(memory)
-        if 'encoding' not in self.entry:
-            return None
+    def decode(self, memory: SparseMemory) -> Any:
+        """
+        Return the typed value for this entry, without formatting it for display:
+            - bcd, int: number, after applying scale and offset
+            - bits: list of strings from `values`, or the sum of integer `values`
+            - enum, dipsw: the matching item from `values`, or "?<n>" if out of range
+            - ch: string, or None if it matches the entry's default
+            - raw: bytes
+            - wpc_rtc: datetime, or None for an invalid date
+            - high scores: dictionary of decoded `initials`, `score` and `timestamp`
+
+        Returns None if the entry lacks an encoding or <memory> doesn't cover it.
+        """
+        if self.sub_entry:
+            return {sub: mapping.decode(memory) for sub, mapping in self.sub_entry.items()}
+        if decode_cache.enabled:
+            cached = decode_cache.lookup(self, memory)
+            return None if cached is None else cached[0]
+        return self.decode_entry(memory)[1]
 
+    def decode_entry(self, memory: SparseMemory) -> Tuple[Optional[bytearray], Any]:
+        """
+        Extract bytes for this entry from <memory> once, and return them along
+        with their decoded value.  See decode() for the types returned.
+        """
+        if self.plan().encoding is None:
+            return None, None
         ba = self.get_bytes(memory)
         if ba is None:
-            return None
+            return None, None
+        return self.decode_bytes(ba)
 
-        encoding = self.entry['encoding']
-        value = self.get_value(memory)
+    def decode_bytes(self, ba: bytearray) -> Tuple[bytearray, Any]:
+        """Decode bytes from get_bytes(); see decode_entry()."""
+        encoding = self.plan().encoding
         if encoding in ['bcd', 'int']:
-            return self.format_value(value)
+            return ba, self.integer_value(ba)
         elif encoding == 'bits':
             values = self.entry.get('values', [])
             if values is None:
-                return '0'
-            if type(values[0]) is int:
+                return ba, 0
+            value = self.integer_value(ba)
+            if not values or type(values[0]) is int:
                 mask = 1
                 bits_value = 0
                 for b in values:
                     if value & mask:
                         bits_value += b
                     mask <<= 1
-                return self.format_value(bits_value)
+                return ba, bits_value
             elif type(values[0]) is str:
                 mask = 1
                 set_values = []
@@ -570,30 +966,51 @@ class RamMapping(object):
                     if value & mask:
                         set_values.append(b)
                     mask <<= 1
-                return ', '.join(set_values)
+                return ba, set_values
             else:
                 raise ValueError('invalid value list', values)
         elif encoding in ['enum', 'dipsw']:
+            value = self.integer_value(ba)
             values = self.entry_values()
             if value >= len(values):
-                return '?' + str(value)
-            return values[value]
-
-        if encoding == 'ch':
-            result = ''
+                return ba, '?' + str(value)
+            return ba, values[value]
+        elif encoding == 'ch':
             char_map = self.metadata.get('char_map')
-            while ba:
-                b = ba.pop(0)
-                if char_map:
-                    result += char_map[b]
-                elif b == 0 and self.entry.get('null', 'ignore') != 'ignore':
+            if char_map:
+                result = ''.join(char_map[b] for b in ba)
+            else:
+                if self.entry.get('null', 'ignore') != 'ignore':
                     # treat as null-terminated or truncated string
-                    break
-                else:
-                    result += chr(b)
+                    null = ba.find(0)
+                    if null >= 0:
+                        ba = ba[:null]
+                result = ba.decode('latin-1')
             if result == self.entry.get('default', '   '):
-                return None
-            return result
+                return ba, None
+            return ba, result
+        elif encoding == 'raw':
+            return ba, bytes(ba)
+        elif encoding == 'wpc_rtc':
+            try:
+                return ba, datetime(ba[0] * 256 + ba[1], ba[2], ba[3], ba[5], ba[6])
+            except ValueError:
+                return ba, None
+        return ba, None
+
+    def format_decoded(self, ba: bytearray, value: Any) -> Optional[str]:
+        """Format a value returned from decode_entry() for display."""
+        encoding = self.plan().encoding
+        if encoding in ['bcd', 'int']:
+            return self.format_value(value)
+        elif encoding == 'bits':
+            if self.entry.get('values', []) is None:
+                return '0'
+            if isinstance(value, list):
+                return ', '.join(value)
+            return self.format_value(value)
+        elif encoding in ['enum', 'dipsw', 'ch']:
+            return value
         elif encoding == 'raw':
             return ' '.join("%02x" % b for b in ba)
         elif encoding == 'wpc_rtc':
@@ -604,6 +1021,23 @@ class RamMapping(object):
                 ba[5], ba[6])
         return '[?' + encoding + '?]'
 
+    def format_entry(self, memory: SparseMemory) -> Optional[str]:
+        """Format bytes from 'memory' for this entry."""
+        if self.entry is None:
+            return None
+        if 'initials' in self.sub_entry or 'score' in self.sub_entry:
+            return self.format_high_score(memory)
+        if 'encoding' not in self.entry:
+            return None
+        if decode_cache.enabled:
+            cached = decode_cache.lookup(self, memory)
+            return None if cached is None else cached[1]
+
+        ba, value = self.decode_entry(memory)
+        if ba is None:
+            return None
+        return self.format_decoded(ba, value)
+
     def format_label(self, key: str = None, short_label: bool = False) -> Optional[str]:
         """
         Return a formatted string for the entry's label, or None if it doesn't have one.
@@ -651,6 +1085,223 @@ class RamMapping(object):
         else:
             raise ValueError('Unrecognized section', self.section)
 
+    def path(self) -> str:
+        """
+        Return a slash-separated name for this entry:
+            - audits, adjustments: <section>/<group>/<key or label>
+            - game_state, dip_switches: <section>/<key or label>
+            - score_record: <group>/<label> (e.g., "high_scores/Grand Champion")
+
+        Names aren't guaranteed to be unique (e.g., game_state keys with a list of entries).
+        """
+        return '/'.join(self.path_parts())
+
+    def path_parts(self, use_label: bool = False) -> Tuple[str, ...]:
+        """
+        Return the segments of path() as a tuple.
+        :param use_label: Set to True to end with the entry's label instead of its key.
+        """
+        label = self.entry.get('label', '?')
+        name = label if use_label else self.key or label
+        if self.section in ['audits', 'adjustments']:
+            return self.section, self.group, name
+        elif self.section == 'score_record':
+            return self.group, label
+        return self.section, name
+
+
+class AddressIndex(object):
+    """
+    Reverse index from memory addresses to the RamMapping and ChecksumMapping
+    objects that use them, for point and range queries.
+    """
+    def __init__(self, mappings: Iterable[Union[RamMapping, ChecksumMapping]]):
+        """
+        :param mappings: objects to index; DIP switch entries are skipped since their
+                         offsets are switch numbers instead of memory addresses
+        """
+        # list of mappings for each address
+        self.entries = {}
+        # mapping for each first offset, with later mappings replacing earlier ones
+        self.starts = {}
+        for m in mappings:
+            if getattr(m, 'section', None) == 'dip_switches':
+                continue
+            offsets = m.offsets()
+            if not offsets:
+                continue
+            self.starts[offsets[0]] = m
+            for address in offsets:
+                self.entries.setdefault(address, []).append(m)
+        self.addresses = sorted(self.entries)
+
+    def lookup(self, address: int) -> List[Union[RamMapping, ChecksumMapping]]:
+        """Return the mappings that include <address>."""
+        return self.entries.get(address, [])
+
+    def lookup_range(self, start: int, end: int) -> List[Union[RamMapping, ChecksumMapping]]:
+        """
+        Return the mappings that include any address from <start> up to, but not
+        including, <end>, in order of their first matching address.
+        """
+        result = []
+        seen = set()
+        first = bisect.bisect_left(self.addresses, start)
+        last = bisect.bisect_left(self.addresses, end)
+        for address in self.addresses[first:last]:
+            for m in self.entries[address]:
+                if id(m) not in seen:
+                    seen.add(id(m))
+                    result.append(m)
+        return result
+
+
+class Selector(object):
+    """
+    A list of patterns compiled against a map, for reading and decoding only the
+    matching entries.  Patterns are paths like those from RamMapping.path(), where
+    the last segment can be an entry's key or label, and each segment can use
+    shell-style wildcards.  A pattern with fewer segments than a path matches
+    everything under it.  For example:
+
+        game_state/credits
+        audits/B.3 Standard Audits/01
+        audits/*/Games Started
+        high_scores/*
+        adjustments
+    """
+    def __init__(self, patterns: Iterable[str], mappings: Iterable[RamMapping]):
+        """
+        :param patterns: selector patterns
+        :param mappings: entries of a map (e.g., ParseNVRAM.mapping)
+        """
+        self.patterns = list(patterns)
+        self.parts = [tuple(pattern.strip('/').split('/')) for pattern in self.patterns]
+        self.mappings = [m for m in mappings if self.matches(m)]
+
+    def matches(self, mapping: RamMapping) -> bool:
+        """Return True if any of the patterns match <mapping>."""
+        import fnmatch
+
+        candidates = [mapping.path_parts()]
+        if mapping.key and 'label' in mapping.entry:
+            candidates.append(mapping.path_parts(use_label=True))
+        for pattern in self.parts:
+            for parts in candidates:
+                if len(pattern) <= len(parts) and all(
+                        fnmatch.fnmatchcase(part, p) for (part, p) in zip(parts, pattern)):
+                    return True
+                # labels can contain slashes, so also try the full path
+                if fnmatch.fnmatchcase('/'.join(parts), '/'.join(pattern)):
+                    return True
+        return False
+
+
+class ChecksumFailure(NamedTuple):
+    """An invalid checksum found by ParseNVRAM.checksum_failures()."""
+    checksum: str  # 'checksum8' or 'checksum16'
+    label: Optional[str]
+    start: int  # address of first byte in the checksummed group
+    end: int  # address of the group's last byte (part of the stored checksum)
+    calculated: int
+    stored: int
+
+
+class FieldChange(NamedTuple):
+    """An entry with a different value in two snapshots, from ParseNVRAM.diff()."""
+    mapping: RamMapping
+    old: Any  # typed value from RamMapping.decode()
+    new: Any
+
+
+def file_stamp(path: str) -> Optional[Tuple[int, int]]:
+    """Return the (modification time, size) of a file, or None if it doesn't exist."""
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None
+    return (info.st_mtime_ns, info.st_size)
+
+
+def load_compiled_map(cache_path: str) -> Optional[dict]:
+    """
+    Return a compiled map saved by save_compiled_map(), or None if it's missing,
+    malformed, from a different COMPILED_MAP_VERSION or Python version, or its
+    platform file has changed.  The platform file is only read (to compare its
+    digest) if its modification time or size differ from when it was compiled;
+    if the digest still matches, the result has 'resave' set to True.
+    """
+    try:
+        with open(cache_path, 'rb') as f:
+            # much faster than marshal.load(), which reads the file in small pieces
+            compiled = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if (not isinstance(compiled, dict) or compiled.get('version') != COMPILED_MAP_VERSION
+            or compiled.get('python') != tuple(sys.version_info[:2])):
+        return None
+    try:
+        platform_name = compiled['platform_name']
+        if platform_name:
+            path = platform_path(platform_name)
+            if file_stamp(path) != compiled['platform_stamp']:
+                if file_digest(path) != compiled['platform_digest']:
+                    return None
+                compiled['resave'] = True
+        if not isinstance(compiled['nv_json'], dict) or not isinstance(compiled['metadata'], dict):
+            return None
+        platform = compiled['platform']
+        for region in platform['memory_layout']:
+            region['nibble'] = Nibble(region['nibble'])
+        mapping = []
+        for (entry, section, group, key, plan) in compiled['mapping']:
+            if not isinstance(entry, dict):
+                return None
+            mapping.append((entry, section, group, key,
+                            None if plan is None else MappingPlan.from_cache(plan)))
+        compiled['mapping'] = mapping
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+    return compiled
+
+
+def cached_plan(mapping: RamMapping) -> Optional[tuple]:
+    """
+    Return the MappingPlan of <mapping> for save_compiled_map(), or None if its
+    entry is malformed (leaving the error for whoever uses the entry).
+    """
+    try:
+        return mapping.plan().to_cache()
+    except PLAN_ERRORS:
+        return None
+
+
+def save_compiled_map(cache_path: str, parser: 'ParseNVRAM') -> None:
+    """
+    Save the map, its resolved platform layout, and the entries of <parser> (with
+    each one's MappingPlan) to <cache_path>, using only plain values so loading a
+    compiled map never creates objects from classes in the file.  Entries are
+    the same dictionaries as in the map, which marshal stores only once.
+    Failures are ignored; the cache is only an optimization.
+    """
+    platform_name = parser.nv_json['_metadata'].get('platform')
+    path = platform_path(platform_name) if platform_name else None
+    platform = dict(parser.platform)
+    platform['memory_layout'] = [dict(region, nibble=region['nibble'].value)
+                                 for region in parser.platform['memory_layout']]
+    compiled = {
+        'version': COMPILED_MAP_VERSION,
+        'python': tuple(sys.version_info[:2]),
+        'platform_name': platform_name,
+        'platform_stamp': file_stamp(path) if path else None,
+        'platform_digest': file_digest(path) if path else None,
+        'nv_json': parser.nv_json,
+        'metadata': {key: value for (key, value) in parser.metadata.items() if key != 'platform'},
+        'platform': platform,
+        'mapping': [(m.entry, m.section, m.group, m.key, cached_plan(m)) for m in parser.mapping],
+    }
+    save_cache(cache_path, compiled)
+
 
 class ParseNVRAM(object):
     def __init__(self, nv_json: dict, nvram: Optional[bytearray] = None) -> None:
@@ -658,6 +1309,7 @@ class ParseNVRAM(object):
         self.metadata: dict[str, Any] = {'big_endian': True, 'nibble': 'both'}
         self.mapping = []
         self.platform = {}
+        self._address_index = None
         if nv_json is not None:
             self.process_json()
         self.memory = SparseMemory()
@@ -669,6 +1321,52 @@ class ParseNVRAM(object):
             self.nv_json = json.load(json_fh)
         self.process_json()
 
+    def load_map(self, map_path: str, use_cache: bool = True) -> None:
+        """
+        Load a map file, reusing a compiled copy from CACHE_ROOT if one exists for
+        the current contents of the map and its platform file.  Otherwise, process
+        the map as load_json() does and save the result for the next caller.
+
+        :param map_path: path to a map file (typically ending in .nv.json)
+        :param use_cache: Set to False to always process the JSON map file.
+        """
+        if not use_cache or not CACHE_ROOT:
+            self.load_json(map_path)
+            return
+
+        with open(map_path, 'rb') as json_fh:
+            map_data = json_fh.read()
+        # include the version so older compiled maps are never loaded
+        cache_path = os.path.join(CACHE_ROOT, '%s.v%u.marshal' % (hashlib.sha1(map_data).hexdigest(),
+                                                                  COMPILED_MAP_VERSION))
+        compiled = load_compiled_map(cache_path)
+        if compiled:
+            self.load_compiled(compiled)
+            if compiled.get('resave'):
+                # record the platform file's new modification time
+                save_compiled_map(cache_path, self)
+            return
+
+        self.nv_json = json.loads(map_data)
+        self.process_json()
+        save_compiled_map(cache_path, self)
+
+    def load_compiled(self, compiled: dict) -> None:
+        """
+        Set up this object from a compiled map returned by load_compiled_map(),
+        without reading the platform file or processing the map again.
+        """
+        self.nv_json = compiled['nv_json']
+        self.platform = compiled['platform']
+        self.metadata = compiled['metadata']
+        self.metadata['platform'] = self.platform
+        self.mapping = []
+        self._address_index = None
+        for (entry, section, group, key, plan) in compiled['mapping']:
+            m = RamMapping(entry, self.metadata, section, group, key)
+            m._plan = plan
+            self.mapping.append(m)
+
     def get_dot_nv(self):
         """
         Reconstruct contents of .nv file loaded with set_nvram() or ParseNVRAM
@@ -687,14 +1385,78 @@ class ParseNVRAM(object):
         """
         Set nvram contents from contents of PinMAME .nv file.
         """
+        if self.memory.mapped is not None:
+            # start over instead of copying <nv_data> into the mapped file; the
+            # mapping is closed once nothing uses it
+            self.memory = SparseMemory()
+        self.fill_memory(self.memory, nv_data)
+
+    def fill_memory(self, memory: SparseMemory, nv_data: bytearray) -> None:
+        """
+        Copy contents of a PinMAME .nv file into <memory>: the platform's nvram
+        area followed by extra PinMAME data.
+        """
         nvram_mem = self.get_memory_area(mem_type='nvram')
         base = nvram_mem.get('address', 0)
         length = nvram_mem.get('size', len(nv_data))
         if length > len(nv_data):
             length = len(nv_data)
-        self.memory.update_memory(base, nv_data[:length])
+        memory.update_memory(base, nv_data[:length])
         if length < len(nv_data):
-            self.memory.set_pinmame_data(nv_data[length:])
+            memory.set_pinmame_data(nv_data[length:])
+
+    def nvram_memory(self, nv_data: bytes) -> SparseMemory:
+        """Return a new SparseMemory object with the contents of a PinMAME .nv file."""
+        memory = SparseMemory()
+        self.fill_memory(memory, bytearray(nv_data))
+        return memory
+
+    def diff(self, old: bytes, new: bytes) -> List[FieldChange]:
+        """
+        Compare two snapshots of a PinMAME .nv file that use this map.  Only entries
+        with an address in a changed byte range (or DIP switches, if the PinMAME
+        data changed) are decoded, along with the map's last_played entry (see
+        last_played_mapping()).  Checksums aren't reported, since they change
+        along with the entries they cover.
+
+        :param old: contents of the earlier .nv file
+        :param new: contents of the later .nv file
+        :return: list of FieldChange tuples for entries with different values
+        """
+        if old == new:
+            return []
+        nvram_area = self.get_memory_area(mem_type='nvram')
+        base = nvram_area['address']
+        nvram_size = min(nvram_area['size'], len(new))
+        index = self.address_index()
+
+        affected = []
+        seen = set()
+        last_played = self.last_played_mapping()
+        if last_played:
+            affected.append(last_played)
+        for (start, end) in changed_ranges(old, new):
+            if end > nvram_size:
+                # PinMAME data (including DIP switches) changed
+                for m in self.mapping:
+                    if m.section == 'dip_switches' and id(m) not in seen:
+                        seen.add(id(m))
+                        affected.append(m)
+            if start < nvram_size:
+                for m in index.lookup_range(base + start, base + min(end, nvram_size)):
+                    if isinstance(m, RamMapping) and id(m) not in seen:
+                        seen.add(id(m))
+                        affected.append(m)
+
+        old_memory = self.nvram_memory(old)
+        new_memory = self.nvram_memory(new)
+        changes = []
+        for m in affected:
+            old_value = m.decode(old_memory)
+            new_value = m.decode(new_memory)
+            if old_value != new_value:
+                changes.append(FieldChange(m, old_value, new_value))
+        return changes
 
     def get_memory_area(self, address: int = None, mem_type: str = None) -> Optional[dict]:
         """
@@ -725,7 +1487,7 @@ class ParseNVRAM(object):
         Load self.platform with the contents of the platform's JSON file.
         """
         if platform_name:
-            with open(os.path.join(MAPS_ROOT, 'platforms', platform_name + '.json')) as platform_file:
+            with open(platform_path(platform_name)) as platform_file:
                 platform_json = json.load(platform_file)
                 self.platform = {
                     'memory_layout': []
@@ -768,6 +1530,9 @@ class ParseNVRAM(object):
     def process_json(self) -> None:
         """Process JSON file loaded into self.nv_json.  Sets self.big_endian and
         self.mapping, a normalized list of JSON entries as RamMapping objects.
+
+        Each entry's MappingPlan is resolved on first use, so a malformed entry
+        only raises an exception when it's used.
         """
         json_metadata = self.nv_json.get('_metadata')
         if json_metadata:
@@ -779,6 +1544,7 @@ class ParseNVRAM(object):
             raise ValueError('Unsupported map file format -- update to v0.6 or later')
 
         self.mapping = []
+        self._address_index = None
         for section in ['audits', 'adjustments']:
             for group in sorted(self.nv_json.get(section, {}).keys()):
                 if group.startswith('_'):
@@ -824,57 +1590,191 @@ class ParseNVRAM(object):
                                                'score_record',
                                                group))
 
-    def load_nvram(self, nvram_path: str) -> None:
-        """Set the nvram property of the ParseNVRAM object to the contents of an nvram file."""
+    def checksum_mappings(self) -> List[ChecksumMapping]:
+        """Return a ChecksumMapping for each checksum8 group and checksum16 entry in the map."""
+        mappings = []
+        for checksum in ['checksum8', 'checksum16']:
+            is_16 = (checksum == 'checksum16')
+            for c in self.nv_json.get(checksum, []):
+                start = to_int(c['start'])
+                if 'end' in c:
+                    end = to_int(c['end'])
+                else:
+                    end = start + to_int(c['length']) - 1
+                grouping = c.get('groupings', end - start + 1)
+                while start < end:
+                    entry_end = start + grouping - 1
+                    mappings.append(ChecksumMapping(start, entry_end,
+                                                    c.get('label'), is_16,
+                                                    self.metadata['big_endian']))
+                    start = entry_end + 1
+        return mappings
+
+    def compile_selector(self, patterns: Iterable[str]) -> Selector:
+        """Return a Selector for the entries of this map matching <patterns>."""
+        return Selector(patterns, self.mapping)
+
+    def select(self, selector: Union[Selector, Iterable[str]]) -> List[Tuple[str, Any]]:
+        """
+        Decode only the entries matching a Selector (or a list of patterns to compile
+        into one).  See RamMapping.decode() for the types of each value.
+
+        :return: list of (path, typed_value) tuples, in map order
+        """
+        if not isinstance(selector, Selector):
+            selector = self.compile_selector(selector)
+        has_dip_switches = bool(self.memory.get_pinmame_data())
+        return [(m.path(), m.decode(self.memory)) for m in selector.mappings
+                if m.section != 'dip_switches' or has_dip_switches]
+
+    def address_index(self) -> AddressIndex:
+        """Return an AddressIndex of all entries and checksums in the map, building it on first use."""
+        if self._address_index is None:
+            self._address_index = AddressIndex(self.mapping + self.checksum_mappings())
+        return self._address_index
+
+    def load_nvram(self, nvram_path: str, use_mmap: bool = False,
+                   writable: bool = False) -> None:
+        """
+        Set the nvram property of the ParseNVRAM object to the contents of an nvram file.
+
+        :param nvram_path: .nv file to load
+        :param use_mmap: Set to True to memory-map the file instead of reading a copy.
+        :param writable: With <use_mmap>, edits (e.g., RamMapping.set_value() and
+                         dipsw_set() on the PinMAME data) modify the file directly;
+                         call self.memory.flush() to write them to disk, and
+                         self.memory.close() when finished.
+        """
+        if use_mmap:
+            nvram_area = self.get_memory_area(mem_type='nvram')
+            self.memory.map_file(nvram_path, writable, nvram_area.get('address', 0),
+                                 nvram_area.get('size'))
+            return
         with open(nvram_path, 'rb') as nv_fh:
             self.set_nvram(bytearray(nv_fh.read()))
 
+    def load_nvram_ranges(self, nvram_path: str,
+                          mappings: Union[Selector, Iterable[RamMapping]] = None,
+                          checksums: bool = False, gap: int = COALESCE_GAP) -> int:
+        """
+        Load only the parts of an nvram file needed to decode some entries, using
+        one os.pread() per range from coalesce_ranges().  The PinMAME data at the
+        end of the file (with the DIP switches) is only read if a dipsw entry needs
+        it.  Meant for files on network filesystems; self.memory only holds the
+        ranges read, so get_dot_nv() and hex_dump() won't work on the result.
+
+        :param nvram_path: .nv file to load
+        :param mappings: entries to decode (e.g., a Selector from compile_selector());
+                         default is all entries in the map
+        :param checksums: Set to True to also read the checksum8 and checksum16 ranges.
+        :param gap: see coalesce_ranges()
+        :return: number of bytes read
+        """
+        if isinstance(mappings, Selector):
+            mappings = mappings.mappings
+        elif mappings is None:
+            mappings = self.mapping
+        mappings = list(mappings)
+        if checksums:
+            for checksum in ['checksum8', 'checksum16']:
+                mappings += [self.ram_mapping(c) for c in self.nv_json.get(checksum, [])]
+
+        nvram_area = self.get_memory_area(mem_type='nvram')
+        base = nvram_area.get('address', 0)
+        offsets = []
+        need_pinmame_data = False
+        for m in mappings:
+            if m.plan().encoding == 'dipsw':
+                need_pinmame_data = True
+            else:
+                offsets.extend(address - base for address in m.plan().offsets)
+
+        self.memory = SparseMemory()
+        bytes_read = 0
+        with open(nvram_path, 'rb') as nv_fh:
+            fd = nv_fh.fileno()
+            file_size = os.fstat(fd).st_size
+            length = min(nvram_area.get('size', file_size), file_size)
+            for (start, end) in coalesce_ranges((o for o in offsets if 0 <= o < length), gap):
+                data = bytearray(os.pread(fd, end - start, start))
+                self.memory.update_memory(base + start, data)
+                bytes_read += len(data)
+            if need_pinmame_data and length < file_size:
+                data = bytearray(os.pread(fd, file_size - length, length))
+                self.memory.set_pinmame_data(data)
+                bytes_read += len(data)
+        return bytes_read
+
     def ram_mapping(self, entry: dict):
         """Legacy "glue" method to create RamMapping object on-demand."""
         return RamMapping(entry, self.metadata)
 
+    def check_checksum8(self, entry: dict, fix: bool = False) -> List[ChecksumFailure]:
+        """
+        Check an entry from the checksum8 attribute of the map file.  Splits the
+        entry's bytes into blocks of `groupings` bytes (default is a single block),
+        where the last byte of each block is 0xFF minus the sum of the others.
+
+        :param entry: dict from the JSON file (*not* a RamMapping object)
+        :param fix: Set to True to fix any invalid checksums in self.memory.
+        :return: list of invalid blocks (empty if all were valid)
+        """
+        m = self.ram_mapping(entry)
+        ba = m.get_bytes(self.memory)
+        if ba is None:
+            return []
+        start = to_int(entry['start'])
+        grouping = entry.get('groupings', len(ba))
+        failures = []
+        fixed = bytearray(ba)
+        for block_start in range(0, len(ba) - grouping + 1, grouping):
+            block_end = block_start + grouping - 1
+            checksum = 0xFF - (sum(ba[block_start:block_end]) & 0xFF)
+            if checksum != ba[block_end]:
+                failures.append(ChecksumFailure('checksum8', entry.get('label'),
+                                                start + block_start, start + block_end,
+                                                checksum, ba[block_end]))
+                fixed[block_end] = checksum
+
+        if fix and failures:
+            plan = m.plan()
+            if plan.start is not None and plan.nibble == Nibble.BOTH and plan.mask is None:
+                # bytes map directly to memory, so write them back at once
+                self.memory.update_memory(start, fixed)
+            else:
+                for failure in failures:
+                    self.memory.update_memory(failure.end, [failure.calculated])
+        return failures
+
     def verify_checksum8(self, entry: dict,
                          verbose: bool = False,
                          fix: bool = False) -> bool:
         """
         Verify an entry from the checksum8 attribute of the map file.
 
-        TODO: Update this to use RamMapping objects instead.  Requires
-        updating verify_all_checksum8() as well.
-
         :param entry: dict from the JSON file (*not* a RamMapping object)
         :param verbose: Set to True to print errors for invalid checksums.
         :param fix: Set to True to fix any invalid checksums in self.nvram.
         :return: True if checksummed area(s) was/were valid
         """
-        valid = True
         label = entry.get('label', '(unlabeled)')
-        m = self.ram_mapping(entry)
-        ba = m.get_bytes(self.memory)
-        if ba is None:
-            return True
-        offset = to_int(entry['start'])
-        grouping = entry.get('groupings', len(ba))
-        if len(ba) % grouping:
-            print("Error: checksum8 '%s' size not evenly divisible by groupings" % label)
-        count = 0
-        calc_sum = 0
-        for b in ba:
-            if count == grouping - 1:
-                checksum = 0xFF - (calc_sum & 0xFF)
-                if checksum != b:
-                    valid = False
-                    if verbose:
-                        print("Error: %u bytes at 0x%04X '%s' checksum8 0x%02X != 0x%02X"
-                              % (grouping, offset - count, label, checksum, b))
-                    if fix:
-                        self.memory.update_memory(offset, [checksum])
-                count = calc_sum = 0
-            else:
-                calc_sum += b
-                count += 1
-            offset += 1
-        return valid
+        grouping = entry.get('groupings')
+        plan = self.ram_mapping(entry).plan()
+        if grouping and self.memory.get_byte(plan.offsets[0]) is not None \
+                and self.memory.get_byte(plan.offsets[-1]) is not None:
+            # size of get_bytes() result, after combining nibbles
+            size = len(plan.offsets)
+            if plan.nibble != Nibble.BOTH:
+                size = (size + 1) // 2
+            if size % grouping:
+                print("Error: checksum8 '%s' size not evenly divisible by groupings" % label)
+        failures = self.check_checksum8(entry, fix)
+        if verbose:
+            for failure in failures:
+                print("Error: %u bytes at 0x%04X '%s' checksum8 0x%02X != 0x%02X"
+                      % (failure.end - failure.start + 1, failure.start, label,
+                         failure.calculated, failure.stored))
+        return not failures
 
     def verify_all_checksum8(self, verbose: bool = False, fix: bool = False) -> bool:
         """
@@ -889,42 +1789,57 @@ class ParseNVRAM(object):
             valid &= self.verify_checksum8(c, verbose, fix)
         return valid
 
+    def check_checksum16(self, entry: dict, fix: bool = False) -> List[ChecksumFailure]:
+        """
+        Check an entry from the checksum16 attribute of the map file, where the last
+        two bytes are 0xFFFF minus the sum of the others.
+
+        :param entry: dict from the JSON file (*not* a RamMapping object)
+        :param fix: Set to True to fix an invalid checksum in self.memory.
+        :return: list with the invalid checksum (empty if it was valid)
+        """
+        m = self.ram_mapping(entry)
+        ba = m.get_bytes(self.memory)
+        if ba is None:
+            return []
+
+        # last two bytes are the stored checksum16
+        if self.metadata['big_endian']:
+            stored_sum = ba[-1] + ba[-2] * 256
+        else:
+            stored_sum = ba[-1] * 256 + ba[-2]
+        start = to_int(entry['start'])
+        checksum_offset = start + len(ba) - 2
+        calc_sum = 0xFFFF - (sum(ba[:-2]) & 0xFFFF)
+        if calc_sum == stored_sum:
+            return []
+
+        if fix:
+            if self.metadata['big_endian']:
+                self.memory.update_memory(checksum_offset, [calc_sum // 256, calc_sum % 256])
+            else:
+                self.memory.update_memory(checksum_offset, [calc_sum % 256, calc_sum // 256])
+        return [ChecksumFailure('checksum16', entry.get('label'),
+                                start, checksum_offset + 1, calc_sum, stored_sum)]
+
     def verify_checksum16(self, entry: dict,
                           verbose: bool = False,
                           fix: bool = False) -> bool:
         """
         Verify an entry from the checksum16 attribute of the map file.
 
-        TODO: Update this to use RamMapping objects instead.  Requires
-        updating verify_all_checksum16() as well.
-
         :param entry: dict from the JSON file (*not* a RamMapping object)
         :param verbose: Set to True to print errors for invalid checksums.
         :param fix: Set to True to fix any invalid checksums in self.memory.
         :return: True if checksummed area was valid
         """
-        m = self.ram_mapping(entry)
-        ba = m.get_bytes(self.memory)
-        if ba is None:
-            return True
-
-        # pop last two bytes as stored checksum16
-        if self.metadata['big_endian']:
-            stored_sum = ba.pop() + ba.pop() * 256
-        else:
-            stored_sum = ba.pop() * 256 + ba.pop()
-        checksum_offset = to_int(entry['start']) + len(ba)
-        calc_sum = 0xFFFF - (sum(ba) & 0xFFFF)
-        if calc_sum != stored_sum:
-            if verbose:
+        failures = self.check_checksum16(entry, fix)
+        if verbose:
+            for failure in failures:
                 print("checksum16 at %s: 0x%04X != 0x%04X %s" % (entry['start'],
-                                                                 calc_sum, stored_sum, entry.get('label', '')))
-            if fix:
-                if self.metadata['big_endian']:
-                    self.memory.update_memory(checksum_offset, [calc_sum // 256, calc_sum % 256])
-                else:
-                    self.memory.update_memory(checksum_offset, [calc_sum % 256, calc_sum // 256])
-        return calc_sum == stored_sum
+                                                                 failure.calculated, failure.stored,
+                                                                 entry.get('label', '')))
+        return not failures
 
     def verify_all_checksum16(self, verbose: bool = False, fix: bool = False) -> bool:
         """
@@ -939,6 +1854,20 @@ class ParseNVRAM(object):
             valid &= self.verify_checksum16(c, verbose, fix)
         return valid
 
+    def checksum_failures(self, fix: bool = False) -> List[ChecksumFailure]:
+        """
+        Check all checksum16 and checksum8 entries from the map file.
+
+        :param fix: Set to True to fix any invalid checksums in self.memory.
+        :return: list of invalid checksums (empty if all were valid)
+        """
+        failures = []
+        for c in self.nv_json.get('checksum16', []):
+            failures += self.check_checksum16(c, fix)
+        for c in self.nv_json.get('checksum8', []):
+            failures += self.check_checksum8(c, fix)
+        return failures
+
     def last_played(self) -> Optional[str]:
         """Return a timestamp if this map has a last_played entry, otherwise returns None."""
         lp = self.nv_json.get('last_played')
@@ -946,6 +1875,18 @@ class ParseNVRAM(object):
             return None
         return self.ram_mapping(lp).format_entry(self.memory)
 
+    def last_played_mapping(self) -> Optional[RamMapping]:
+        """
+        Return a RamMapping for the map's last_played entry, with a section of
+        'last_played', or None if the map doesn't have one.
+        """
+        lp = self.nv_json.get('last_played')
+        if not lp:
+            return None
+        entry = dict(lp)
+        entry.setdefault('label', 'Last Played')
+        return RamMapping(entry, self.metadata, 'last_played', 'Last Played')
+
     def entry_list(self, section: str, group: str) -> List[Tuple[str, dict]]:
         """Return a list of entries for the given section and group of the mapping file.
 
@@ -965,6 +1906,30 @@ class ParseNVRAM(object):
             ValueError("Can't process %s/%s" % (section, group))
         return entries
 
+    def iter_values(self, section: str = None, group: str = None,
+                    selector: Selector = None) -> Iterator[Tuple[str, str, Optional[str], Optional[str], Any]]:
+        """
+        Lazily generate typed values for entries in this map, without formatting
+        them for display.  See RamMapping.decode() for the types of each value.
+
+        :param section: Limit to a single section (e.g., 'audits', 'game_state',
+                        'score_record').
+        :param group: Limit to a single group (e.g., 'Game State', 'high_scores').
+        :param selector: Limit to entries matching a Selector from compile_selector().
+        :return: Iterator of (section, group, key, label, typed_value) tuples.
+        """
+        has_dip_switches = bool(self.memory.get_pinmame_data())
+        for map_entry in selector.mappings if selector is not None else self.mapping:
+            if section is not None and map_entry.section != section:
+                continue
+            if group is not None and map_entry.group != group:
+                continue
+            if map_entry.section == 'dip_switches' and not has_dip_switches:
+                # DIP switch values only available from loaded .nv file
+                continue
+            yield (map_entry.section, map_entry.group, map_entry.key,
+                   map_entry.format_label(), map_entry.decode(self.memory))
+
     # section should be 'high_scores' or 'mode_champions'
     def high_scores(self, section: str = 'high_scores',
                     short_labels: bool = False) -> List[str]:
@@ -1036,7 +2001,7 @@ class ParseNVRAM(object):
 
             if nibble == Nibble.BOTH:
                 # we can potentially have printable text
-                if isprint(value):
+                if 0x20 <= value < 0x7F:
                     ch.append(chr(value))
                 else:
                     ch.append('.')
@@ -1069,33 +2034,8 @@ class ParseNVRAM(object):
         nvram_size = memory_area['size']
         nibble = memory_area['nibble']
 
-        # Create a dictionary of RamMapping objects using offset as the key.
-        entry = {}
-        for m in self.mapping:
-            if m.section == 'dip_switches':
-                # skip over dip_switches -- their offsets aren't memory addresses
-                continue
-
-            # sometimes offsets is a map(?) so convert it to a list
-            offsets = list(m.offsets())
-            entry[offsets[0]] = m
-
-        # add fake entries for checksum8 and checksum16 values
-        for checksum in ['checksum8', 'checksum16']:
-            is_16 = (checksum == 'checksum16')
-            for c in self.nv_json.get(checksum, []):
-                start = to_int(c['start'])
-                if 'end' in c:
-                    end = to_int(c['end'])
-                else:
-                    end = start + to_int(c['length']) - 1
-                grouping = c.get('groupings', end - start + 1)
-                while start < end:
-                    entry_end = start + grouping - 1
-                    entry[entry_end - is_16] = ChecksumMapping(start, entry_end,
-                                                               c.get('label'), is_16,
-                                                               self.metadata['big_endian'])
-                    start = entry_end + 1
+        # RamMapping and ChecksumMapping objects using their first offset as the key
+        entry = self.address_index().starts
 
         offset = 0
         while offset < nvram_size:
@@ -1138,47 +2078,1027 @@ class ParseNVRAM(object):
                 offset += count
 
 
+class Instrumentation(object):
+    """
+    Opt-in call counts and times for each stage of loading and parsing a map and
+    .nv file, with decoding broken down by encoding.  Calling enable() wraps the
+    methods listed in STAGES with timers, and disable() restores them, so there's
+    no overhead while disabled.
+
+    Set the NVRAM_PARSER_PROFILE environment variable to enable it for a whole
+    process: "1" prints summary() to stderr at exit, and any other value is a
+    path to write chrome_trace() to (for chrome://tracing or Perfetto) as well.
+    Only the current process is measured, not --batch worker processes.
+    """
+    # (class, method, stage) for each timed method; the decode_bytes stage gets
+    # a suffix of the entry's encoding (e.g., "decode:bcd")
+    STAGES = [
+        ('ParseNVRAM', 'load_map', 'load_map'),
+        ('ParseNVRAM', 'load_json', 'load_json'),
+        ('ParseNVRAM', 'load_platform', 'load_platform'),
+        ('ParseNVRAM', 'process_json', 'process_json'),
+        ('ParseNVRAM', 'fill_memory', 'set_nvram'),
+        ('ParseNVRAM', 'check_checksum8', 'checksum8'),
+        ('ParseNVRAM', 'check_checksum16', 'checksum16'),
+        ('ParseNVRAM', 'dump', 'dump'),
+        ('ParseNVRAM', 'hex_dump', 'hex_dump'),
+        ('RamMapping', 'get_bytes', 'get_bytes'),
+        ('RamMapping', 'decode_bytes', 'decode'),
+        ('RamMapping', 'format_decoded', 'format'),
+        ('RamMapping', 'format_high_score', 'format_high_score'),
+    ]
+
+    def __init__(self):
+        self.enabled = False
+        self.trace = False
+        self.originals = []
+        self.reset()
+
+    def reset(self) -> None:
+        """Discard all recorded times."""
+        self.counts = {}
+        self.totals = {}
+        self.self_totals = {}
+        self.events = []
+        # trace timestamps are relative to when recording starts (see enable())
+        self.epoch = self.perf_counter() if self.enabled else None
+
+    def enable(self, trace: bool = False) -> None:
+        """
+        Start recording.
+        :param trace: Set to True to also record each call for chrome_trace().
+        """
+        import threading
+        import time
+
+        self.trace = trace
+        if self.enabled:
+            return
+        self.enabled = True
+        self.perf_counter = time.perf_counter
+        if self.epoch is None:
+            self.epoch = self.perf_counter()
+        self.local = threading.local()
+        self.get_ident = threading.get_ident
+        for (class_name, method_name, stage) in self.STAGES:
+            cls = globals()[class_name]
+            original = cls.__dict__[method_name]
+            self.originals.append((cls, method_name, original))
+            setattr(cls, method_name, self.timed(original, stage))
+
+    def disable(self) -> None:
+        """Stop recording and remove the timers; recorded times are kept."""
+        for (cls, method_name, original) in self.originals:
+            setattr(cls, method_name, original)
+        self.originals = []
+        self.enabled = False
+
+    def timed(self, method, stage: str):
+        """Return a wrapper for <method> that records each call under <stage>."""
+        perf_counter = self.perf_counter
+
+        def wrapper(obj, *args, **kwargs):
+            name = stage
+            if stage == 'decode':
+                name = 'decode:%s' % obj.plan().encoding
+            stack = getattr(self.local, 'stack', None)
+            if stack is None:
+                stack = self.local.stack = []
+            stack.append(0.0)
+            start = perf_counter()
+            try:
+                return method(obj, *args, **kwargs)
+            finally:
+                end = perf_counter()
+                children = stack.pop()
+                if stack:
+                    stack[-1] += end - start
+                self.record(name, start, end, children)
+
+        wrapper.__name__ = method.__name__
+        wrapper.__doc__ = method.__doc__
+        return wrapper
+
+    def record(self, stage: str, start: float, end: float, children: float = 0.0) -> None:
+        """Record a call to <stage>, where <children> is time spent in nested stages."""
+        self.counts[stage] = self.counts.get(stage, 0) + 1
+        self.totals[stage] = self.totals.get(stage, 0.0) + end - start
+        self.self_totals[stage] = self.self_totals.get(stage, 0.0) + end - start - children
+        if self.trace:
+            self.events.append({
+                'name': stage,
+                'ph': 'X',
+                'ts': (start - self.epoch) * 1000000,
+                'dur': (end - start) * 1000000,
+                'pid': os.getpid(),
+                'tid': self.get_ident(),
+            })
+
+    def summary(self) -> str:
+        """
+        Return a table of calls, total time (including nested stages) and self
+        time for each stage, sorted by self time.
+        """
+        lines = ['%-20s %10s %12s %12s %10s' % ('stage', 'calls', 'total ms', 'self ms', 'mean us')]
+        for stage in sorted(self.counts, key=lambda s: -self.self_totals[s]):
+            count = self.counts[stage]
+            lines.append('%-20s %10u %12.3f %12.3f %10.2f' %
+                         (stage, count, self.totals[stage] * 1000,
+                          self.self_totals[stage] * 1000, self.totals[stage] * 1000000 / count))
+        return '\n'.join(lines)
+
+    def chrome_trace(self) -> dict:
+        """Return the calls recorded with enable(trace=True) in Chrome's Trace Event format."""
+        return {'traceEvents': self.events, 'displayTimeUnit': 'ms'}
+
+    def write_trace(self, path: str) -> None:
+        """Write chrome_trace() to <path> as JSON."""
+        with open(path, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+
+
+class DecodeCache(object):
+    """
+    Optional bounded LRU cache of decoded and formatted values, keyed by a
+    RamMapping and the bytes returned by its get_bytes().  Across many .nv files
+    that share a map (e.g., --batch, which reuses one ParseNVRAM per map), most
+    entries hold identical bytes, so they're only decoded and formatted once.
+
+    Enable it with enable() or by setting NVRAM_DECODE_CACHE to the maximum number
+    of entries, which also prints stats() to stderr at exit.  Each caller gets its
+    own copy of a cached list (e.g., from a bits entry), so callers can modify it.
+
+    --batch worker processes each have their own cache; dump_batch() adds their
+    counts to the parent's with merge(), so stats() covers the whole batch.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.maxsize = 0
+        self.entries = None
+        self.lock = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # stats of other processes keyed by process ID, from merge()
+        self.workers = {}
+
+    def enable(self, maxsize: int = 65536) -> None:
+        """Start caching up to <maxsize> values, discarding any current entries."""
+        import collections
+        import threading
+
+        self.maxsize = maxsize
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+        self.workers = {}
+        self.enabled = maxsize > 0
+
+    def disable(self) -> None:
+        """Stop caching and discard all entries; stats() are kept."""
+        self.enabled = False
+        self.entries = None
+
+    def lookup(self, mapping: RamMapping, memory: SparseMemory) -> Optional[Tuple[Any, Optional[str]]]:
+        """
+        Return (typed value, formatted value) for <mapping> in <memory>, decoding and
+        formatting the entry's bytes if they aren't in the cache.  Returns None if
+        <memory> doesn't cover the entry or it doesn't have an encoding.
+        """
+        if mapping.plan().encoding is None:
+            return None
+        ba = mapping.get_bytes(memory)
+        if ba is None:
+            return None
+        # use the current dictionary and lock even if disable() is called meanwhile
+        entries = self.entries
+        lock = self.lock
+        if entries is None:
+            ba, value = mapping.decode_bytes(ba)
+            return value, mapping.format_decoded(ba, value)
+
+        key = (mapping, bytes(ba))
+        with lock:
+            cached = entries.get(key)
+            if cached is not None:
+                self.hits += 1
+                entries.move_to_end(key)
+            else:
+                self.misses += 1
+
+        if cached is None:
+            ba, value = mapping.decode_bytes(ba)
+            cached = (value, mapping.format_decoded(ba, value))
+            with lock:
+                entries[key] = cached
+                if len(entries) > self.maxsize:
+                    entries.popitem(last=False)
+                    self.evictions += 1
+        (value, formatted) = cached
+        if isinstance(value, list):
+            value = list(value)
+        return value, formatted
+
+    def counters(self) -> Tuple[int, int, int]:
+        """Return (hits, misses, evictions) so far, for task_stats()."""
+        return (self.hits, self.misses, self.evictions)
+
+    def task_stats(self, start: Tuple[int, int, int]) -> Optional[dict]:
+        """
+        Return the stats of a task in this process since counters() returned
+        <start>, for merge() in another process, or None if the cache is disabled.
+        """
+        if not self.enabled:
+            return None
+        return {
+            'pid': os.getpid(),
+            'hits': self.hits - start[0],
+            'misses': self.misses - start[1],
+            'evictions': self.evictions - start[2],
+            'size': len(self.entries) if self.entries is not None else 0,
+        }
+
+    def merge(self, task_stats: dict) -> None:
+        """Add the stats of a task run in another process, from its task_stats()."""
+        worker = self.workers.setdefault(task_stats['pid'],
+                                         {'hits': 0, 'misses': 0, 'evictions': 0, 'size': 0})
+        for key in ['hits', 'misses', 'evictions']:
+            worker[key] += task_stats[key]
+        worker['size'] = task_stats['size']
+
+    def stats(self) -> dict:
+        """
+        Return hits, misses, hit_rate, evictions, size and maxsize, including
+        other processes added with merge(); processes is the number of processes
+        that used the cache, and maxsize is the total for all of them.
+        """
+        hits = self.hits + sum(w['hits'] for w in self.workers.values())
+        misses = self.misses + sum(w['misses'] for w in self.workers.values())
+        lookups = hits + misses
+        processes = len(self.workers)
+        if self.hits + self.misses or not self.workers:
+            processes += 1
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'evictions': self.evictions + sum(w['evictions'] for w in self.workers.values()),
+            'size': ((len(self.entries) if self.entries is not None else 0) +
+                     sum(w['size'] for w in self.workers.values())),
+            'maxsize': self.maxsize * processes,
+            'processes': processes,
+        }
+
+
+def report_decode_cache() -> None:
+    """Called at exit when NVRAM_DECODE_CACHE is set; see DecodeCache."""
+    stats = decode_cache.stats()
+    print('decode cache: %u hits, %u misses (%.1f%% hit rate), %u of %u entries used, %u evictions%s'
+          % (stats['hits'], stats['misses'], stats['hit_rate'] * 100, stats['size'],
+             stats['maxsize'], stats['evictions'],
+             ' in %u processes' % stats['processes'] if stats['processes'] > 1 else ''),
+          file=sys.stderr)
+
+
+def report_instrumentation(trace_path: Optional[str]) -> None:
+    """Called at exit when NVRAM_PARSER_PROFILE is set; see Instrumentation."""
+    if trace_path:
+        instrumentation.write_trace(trace_path)
+    print(instrumentation.summary(), file=sys.stderr)
+
+
+# shared by all callers in this process
+instrumentation = Instrumentation()
+decode_cache = DecodeCache()
+
+if os.environ.get('NVRAM_PARSER_PROFILE'):
+    import atexit
+
+    profile_env = os.environ['NVRAM_PARSER_PROFILE']
+    instrumentation.enable(trace=profile_env != '1')
+    atexit.register(report_instrumentation, profile_env if profile_env != '1' else None)
+
+if os.environ.get('NVRAM_DECODE_CACHE'):
+    import atexit
+
+    cache_env = os.environ['NVRAM_DECODE_CACHE']
+    try:
+        decode_cache.enable(int(cache_env))
+        atexit.register(report_decode_cache)
+    except ValueError:
+        print('Ignoring NVRAM_DECODE_CACHE=%r; it should be a number of entries' % cache_env,
+              file=sys.stderr)
+
+
+# ParseNVRAM objects with maps loaded, keyed by map path, for reuse by batch workers
+batch_parsers = {}
+
+
+def is_archive(path: str) -> bool:
+    """Return True if <path> names a zip, tar or gzip archive supported by iter_archive()."""
+    return path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def iter_archive(archive_path: str) -> Iterator[Tuple[str, bytes]]:
+    """
+    Generate the .nv files stored in a zip file, a (possibly compressed) tar file,
+    or a single gzipped .nv file, reading them directly from the archive instead
+    of extracting them to disk.  Tar files are read as a stream, one member at a time.
+
+    :param archive_path: archive to read
+    :return: iterator of (member name, contents) tuples; pass the member name to
+             rom_for_nvpath() and the contents to ParseNVRAM.set_nvram()
+    """
+    import gzip
+    import tarfile
+    import zipfile
+
+    lower = archive_path.lower()
+    if lower.endswith('.zip'):
+        with zipfile.ZipFile(archive_path) as zf:
+            for info in zf.infolist():
+                if not info.is_dir() and info.filename.endswith('.nv'):
+                    yield info.filename, zf.read(info)
+    elif lower.endswith('.nv.gz'):
+        with gzip.open(archive_path, 'rb') as f:
+            yield os.path.basename(archive_path)[:-3], f.read()
+    else:
+        with tarfile.open(archive_path, 'r|*') as tar:
+            for member in tar:
+                if member.isfile() and member.name.endswith('.nv'):
+                    yield member.name, tar.extractfile(member).read()
+
+
+def open_nvram(nvpath: str, map_path: str, parsers: dict = None,
+               nvram: bytes = None) -> ParseNVRAM:
+    """
+    Return a ParseNVRAM object for a .nv file.
+
+    :param nvpath: .nv file to load
+    :param map_path: map to use for <nvpath>
+    :param parsers: dictionary of ParseNVRAM objects keyed by map path, used to
+                    avoid reloading a map when processing multiple files
+    :param nvram: contents of <nvpath> (e.g., an archive member from iter_archive()),
+                  instead of reading it from disk
+    """
+    if nvram is None:
+        with open(nvpath, 'rb') as f:
+            nvram = f.read()
+    nvram = bytearray(nvram)
+    p = parsers.get(map_path) if parsers is not None else None
+    if p is None:
+        p = ParseNVRAM(None)
+        p.load_map(map_path)
+        if parsers is not None:
+            parsers[map_path] = p
+    else:
+        p.memory = SparseMemory()
+    p.set_nvram(nvram)
+    return p
+
+
+def dump_nvram(nvpath: str, map_path: str = None, rom: str = None,
+               parsers: dict = None, nvram: bytes = None) -> None:
+    """
+    Print the contents of a .nv file, as shown by the --dump option.
+
+    :param nvpath: .nv file to dump
+    :param map_path: use this map instead of the one for <rom>
+    :param rom: use default map for <rom> instead of one based on <nvpath>
+    :param parsers: see open_nvram()
+    :param nvram: see open_nvram()
+    """
+    basename = os.path.basename(nvpath)
+    if not map_path:
+        # find a JSON file for the given nvram file
+        if not rom:
+            rom = rom_for_nvpath(nvpath)
+        map_path = map_for_rom(rom)
+
+        if map_path:
+            print("Using map %s for %s" %
+                  (os.path.relpath(map_path), basename))
+        else:
+            print("Couldn't find a map for %s" % basename)
+            return
+
+    print("Dumping known entries for %s [%s]..." % (basename, rom_name(rom_for_nvpath(nvpath))))
+    open_nvram(nvpath, map_path, parsers, nvram).dump()
+
+
+def json_value(value: Any) -> Any:
+    """Convert a value from RamMapping.decode() to a type supported by JSON."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    elif isinstance(value, bytes):
+        return value.hex()
+    elif isinstance(value, dict):
+        return {key: json_value(v) for key, v in value.items()}
+    return value
+
+
+def iter_records(parser: ParseNVRAM, nvpath: str, selector: Selector = None) -> Iterator[dict]:
+    """
+    Generate one record per entry of a loaded .nv file, with keys from RECORD_FIELDS
+    and a typed value from ParseNVRAM.iter_values().
+
+    :param selector: only include entries matching this Selector
+    """
+    basename = os.path.basename(nvpath)
+    rom = rom_for_nvpath(nvpath)
+    for (section, group, key, label, value) in parser.iter_values(selector=selector):
+        yield {
+            'file': basename,
+            'rom': rom,
+            'section': section,
+            'group': group,
+            'key': key,
+            'label': label,
+            'value': value,
+        }
+
+
+def write_ndjson(records: Iterable[dict], fh: TextIO) -> None:
+    """Write records from iter_records() to <fh> as newline-delimited JSON."""
+    for record in records:
+        fh.write(json.dumps(dict(record, value=json_value(record['value']))))
+        fh.write('\n')
+
+
+def write_csv(records: Iterable[dict], fh: TextIO, header: bool = True) -> None:
+    """
+    Write records from iter_records() to <fh> as CSV, with one row per entry.  Lists
+    and dictionaries (bits and high score entries) are written as JSON.
+    """
+    import csv
+    writer = csv.DictWriter(fh, RECORD_FIELDS, lineterminator='\n')
+    if header:
+        writer.writeheader()
+    for record in records:
+        value = record['value']
+        if isinstance(value, (list, dict)):
+            value = json.dumps(json_value(value))
+        else:
+            value = json_value(value)
+        writer.writerow(dict(record, value=value))
+
+
+def export_nvram(nvpath: str, output_format: str, fh: TextIO,
+                 map_path: str = None, rom: str = None,
+                 parsers: dict = None, header: bool = True,
+                 nvram: bytes = None) -> None:
+    """
+    Write the entries of a .nv file to <fh> in 'ndjson' or 'csv' format.
+
+    :param nvpath: .nv file to export
+    :param output_format: 'ndjson' or 'csv'
+    :param fh: destination for records
+    :param map_path: use this map instead of the one for <rom>
+    :param rom: use default map for <rom> instead of one based on <nvpath>
+    :param parsers: see open_nvram()
+    :param header: include a header row in csv output
+    :param nvram: see open_nvram()
+    """
+    if not map_path:
+        map_path = map_for_rom(rom or rom_for_nvpath(nvpath))
+        if not map_path:
+            print("Couldn't find a map for %s" % os.path.basename(nvpath), file=sys.stderr)
+            return
+
+    records = iter_records(open_nvram(nvpath, map_path, parsers, nvram), nvpath)
+    if output_format == 'ndjson':
+        write_ndjson(records, fh)
+    elif output_format == 'csv':
+        write_csv(records, fh, header)
+    else:
+        raise ValueError('Unsupported output format %s' % output_format)
+
+
+def select_nvram(nvpath: str, patterns: List[str], output_format: str = 'text',
+                 fh: TextIO = None, map_path: str = None, rom: str = None,
+                 parsers: dict = None, header: bool = True, nvram: bytes = None) -> None:
+    """
+    Print the entries of a .nv file that match selector patterns, as shown by the
+    --select option.  See Selector for the pattern syntax.
+
+    :param nvpath: .nv file to read
+    :param patterns: selector patterns
+    :param output_format: 'text', 'ndjson' or 'csv'
+    :param fh: destination for output (default is stdout)
+    :param map_path: use this map instead of the one for <rom>
+    :param rom: use default map for <rom> instead of one based on <nvpath>
+    :param parsers: see open_nvram()
+    :param header: include a header row in csv output
+    :param nvram: see open_nvram(); otherwise, only the parts of <nvpath> needed
+                  for the selected entries are read
+    """
+    fh = fh or sys.stdout
+    if not map_path:
+        map_path = map_for_rom(rom or rom_for_nvpath(nvpath))
+        if not map_path:
+            print("Couldn't find a map for %s" % os.path.basename(nvpath), file=sys.stderr)
+            return
+
+    p = parsers.get(map_path) if parsers is not None else None
+    if p is None:
+        p = ParseNVRAM(None)
+        p.load_map(map_path)
+        if parsers is not None:
+            parsers[map_path] = p
+    selector = p.compile_selector(patterns)
+    if not selector.mappings:
+        print('No entries match %s' % ', '.join(patterns), file=sys.stderr)
+        return
+    if nvram is None:
+        p.load_nvram_ranges(nvpath, selector)
+    else:
+        p.memory = SparseMemory()
+        p.set_nvram(bytearray(nvram))
+    if output_format == 'text':
+        has_dip_switches = bool(p.memory.get_pinmame_data())
+        for m in selector.mappings:
+            if m.section != 'dip_switches' or has_dip_switches:
+                fh.write('%s: %s\n' % (m.path(), m.format_entry(p.memory)))
+    elif output_format == 'ndjson':
+        write_ndjson(iter_records(p, nvpath, selector), fh)
+    else:
+        write_csv(iter_records(p, nvpath, selector), fh, header)
+
+
+def dump_batch_task(task: Tuple[List[Tuple[str, str, Optional[bytes]]], Optional[str],
+                                Optional[str], str, Optional[List[str]]]
+                    ) -> Tuple[List[Tuple[str, str, str]], Optional[dict]]:
+    """
+    Worker for dump_batch(): dump a list of .nv files.
+    :param task: tuple of (items, map_path, rom, output_format, patterns) with
+                 arguments for dump_nvram(), export_nvram() or (if <patterns> isn't
+                 None) select_nvram(), where <items> is a list of
+                 (name, nvpath, nvram) tuples, <name> is the file's name for
+                 --output-dir (see batch_tasks()), and <nvram> is None for files
+                 on disk or the contents of an archive member
+    :return: list of (name, output, errors) tuples, where <errors> holds messages
+             and tracebacks for stderr, kept out of <output> so they can't corrupt
+             ndjson or csv records, and the task's DecodeCache.task_stats()
+    """
+    import contextlib
+    import traceback
+
+    (items, map_path, rom, output_format, patterns) = task
+    cache_start = decode_cache.counters()
+    results = []
+    for (name, nvpath, nvram) in items:
+        output = io.StringIO()
+        errors = io.StringIO()
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(errors):
+            try:
+                if patterns:
+                    if output_format == 'text':
+                        print('Selected entries for %s [%s]...' %
+                              (os.path.basename(nvpath), rom_name(rom_for_nvpath(nvpath))))
+                    select_nvram(nvpath, patterns, output_format, output, map_path, rom,
+                                 batch_parsers, header=False, nvram=nvram)
+                elif output_format == 'text':
+                    dump_nvram(nvpath, map_path, rom, batch_parsers, nvram)
+                else:
+                    export_nvram(nvpath, output_format, output, map_path, rom,
+                                 batch_parsers, header=False, nvram=nvram)
+            except Exception:
+                errors.write('Error processing %s:\n' % nvpath)
+                traceback.print_exc(file=errors)
+        results.append((name, output.getvalue(), errors.getvalue()))
+    return results, decode_cache.task_stats(cache_start)
+
+
+def batch_files(pattern: str) -> List[str]:
+    """
+    Return a sorted list of .nv files in directory <pattern>, or of .nv files and
+    archives (see is_archive()) matching glob <pattern>.
+    """
+    import glob
+
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, '*.nv')
+    return sorted(glob.glob(pattern))
+
+
+def pool_results(pool: 'concurrent.futures.Executor', func, tasks: Iterable,
+                 window: int) -> Iterator:
+    """
+    Like pool.map(func, tasks), but only reads <window> tasks ahead from <tasks>,
+    so tasks holding archive members aren't all read into memory at once.
+    """
+    pending = []
+    for task in tasks:
+        pending.append(pool.submit(func, task))
+        if len(pending) >= window:
+            yield pending.pop(0).result()
+    for future in pending:
+        yield future.result()
+
+
+def member_name(archive_path: str, member: str) -> str:
+    """
+    Return the name used by --output-dir for an archive member: its path in the
+    archive, in a directory named after the archive, without any absolute or
+    parent directory components.
+    """
+    parts = [part for part in member.replace('\\', '/').split('/')
+             if part not in ['', '.', '..']]
+    return os.path.join(os.path.basename(archive_path), *parts)
+
+
+def batch_tasks(nvpaths: List[str], map_path: str = None, rom: str = None,
+                output_format: str = 'text', patterns: List[str] = None) -> Iterator[tuple]:
+    """
+    Generate tasks for dump_batch_task().  Files on disk are grouped by map and
+    named by their basename; the members of each archive are read in order,
+    without extracting them to disk, and named by member_name().
+    See dump_batch() for parameters.
+    """
+    groups = {}
+    archives = []
+    for nvpath in nvpaths:
+        if is_archive(nvpath):
+            archives.append(nvpath)
+            continue
+        nv_map = map_path or map_for_rom(rom or rom_for_nvpath(nvpath))
+        groups.setdefault(nv_map, []).append((os.path.basename(nvpath), nvpath, None))
+    for group in groups.values():
+        for index in range(0, len(group), BATCH_CHUNK_SIZE):
+            yield (group[index:index + BATCH_CHUNK_SIZE], map_path, rom, output_format, patterns)
+
+    for archive_path in archives:
+        items = []
+        for (member, nvram) in iter_archive(archive_path):
+            items.append((member_name(archive_path, member), member, nvram))
+            if len(items) == BATCH_CHUNK_SIZE:
+                yield (items, map_path, rom, output_format, patterns)
+                items = []
+        if items:
+            yield (items, map_path, rom, output_format, patterns)
+
+
+def unique_name(name: str, used: set) -> str:
+    """
+    Return <name>, or <name> with a "~2" (or "~3", etc.) suffix if it's already
+    in <used>, and add the result to <used>.
+    """
+    result = name
+    count = 1
+    while result in used:
+        count += 1
+        result = '%s~%u' % (name, count)
+    used.add(result)
+    return result
+
+
+def dump_batch(nvpaths: List[str], map_path: str = None, rom: str = None,
+               jobs: int = None, output_dir: str = None,
+               output_format: str = 'text', patterns: List[str] = None) -> None:
+    """
+    Dump multiple .nv files in a pool of worker processes.  Files are grouped by
+    map, so each worker loads a given map once.
+
+    :param nvpaths: .nv files and archives of .nv files (see iter_archive()) to dump
+    :param map_path: use this map for all files
+    :param rom: use default map for <rom> for all files
+    :param jobs: number of worker processes (default is one per CPU); set to 1 to
+                 dump everything in the current process
+    :param output_dir: write each file's dump to <output_dir>/<basename>.txt
+                       (or .ndjson or .csv) instead of to stdout, or to
+                       <output_dir>/<archive>/<member>.txt for archive members;
+                       a "~2" suffix is added to names used by an earlier file
+    :param output_format: 'text', 'ndjson' or 'csv'
+    :param patterns: only output entries matching these selector patterns (see Selector)
+    """
+    import contextlib
+
+    tasks = batch_tasks(nvpaths, map_path, rom, output_format, patterns)
+
+    csv_header = ''
+    if output_format == 'csv':
+        csv_header = ','.join(RECORD_FIELDS) + '\n'
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        extension = '.txt' if output_format == 'text' else '.' + output_format
+    else:
+        sys.stdout.write(csv_header)
+
+    used_names = set()
+    with contextlib.ExitStack() as stack:
+        if jobs == 1:
+            results = map(dump_batch_task, tasks)
+        else:
+            import concurrent.futures
+            pool = stack.enter_context(concurrent.futures.ProcessPoolExecutor(max_workers=jobs))
+            results = pool_results(pool, dump_batch_task, tasks,
+                                   2 * (jobs or os.cpu_count() or 1))
+        for (task_results, cache_stats) in results:
+            if cache_stats and jobs != 1:
+                # the task ran in a worker process, with its own cache
+                decode_cache.merge(cache_stats)
+            for (name, output, errors) in task_results:
+                sys.stderr.write(errors)
+                if output_dir:
+                    unique = unique_name(name, used_names)
+                    if unique != name:
+                        print('Writing %s as %s, since the name was already used' %
+                              (name, unique), file=sys.stderr)
+                    output_path = os.path.join(output_dir, unique + extension)
+                    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                    with open(output_path, 'w') as f:
+                        f.write(csv_header)
+                        f.write(output)
+                else:
+                    sys.stdout.write(output)
+
+
+def inotify_changes(directory: str) -> Optional[Iterator[str]]:
+    """
+    Use Linux inotify to generate paths of .nv files as they're rewritten in
+    <directory>.  Returns None if inotify isn't available.
+    """
+    try:
+        import ctypes
+        import ctypes.util
+        import select
+        import struct
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        inotify_init1 = libc.inotify_init1
+        inotify_add_watch = libc.inotify_add_watch
+    except (ImportError, OSError, AttributeError):
+        return None
+
+    in_close_write = 0x08
+    in_moved_to = 0x80
+    fd = inotify_init1(os.O_CLOEXEC)
+    if fd < 0:
+        return None
+    if inotify_add_watch(fd, os.fsencode(directory), in_close_write | in_moved_to) < 0:
+        os.close(fd)
+        return None
+
+    def events() -> Iterator[str]:
+        header = struct.Struct('iIII')
+        try:
+            while True:
+                select.select([fd], [], [])
+                buffer = os.read(fd, 65536)
+                offset = 0
+                while offset < len(buffer):
+                    (_, _, _, name_length) = header.unpack_from(buffer, offset)
+                    offset += header.size
+                    name = buffer[offset:offset + name_length].rstrip(b'\0')
+                    offset += name_length
+                    if name.endswith(b'.nv'):
+                        yield os.path.join(directory, os.fsdecode(name))
+        finally:
+            os.close(fd)
+
+    return events()
+
+
+def poll_changes(directory: str, interval: float = 1.0) -> Iterator[str]:
+    """
+    Check <directory> every <interval> seconds and generate paths of .nv files
+    with a new modification time or size.  Like inotify_changes(), the current
+    state of the directory is recorded before returning, so files can be loaded
+    afterwards without missing changes made in between.
+    """
+    import time
+
+    def scan() -> dict:
+        current = {}
+        for entry in os.scandir(directory):
+            if entry.name.endswith('.nv') and entry.is_file():
+                stat = entry.stat()
+                current[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        return current
+
+    def events(stamps: dict) -> Iterator[str]:
+        while True:
+            time.sleep(interval)
+            current = scan()
+            for path, stamp in sorted(current.items()):
+                if stamps.get(path) != stamp:
+                    yield path
+            stamps = current
+
+    return events(scan())
+
+
+def change_events(nvpath: str, changes: List[FieldChange]) -> List[dict]:
+    """
+    Convert the result of ParseNVRAM.diff() to a list of dictionaries with keys
+    file, rom, section, group, key, label, old and new, for output as JSON.
+    """
+    basename = os.path.basename(nvpath)
+    rom = rom_for_nvpath(nvpath)
+    events = []
+    for change in changes:
+        m = change.mapping
+        events.append({
+            'file': basename,
+            'rom': rom,
+            'section': m.section,
+            'group': m.group,
+            'key': m.key,
+            'label': m.format_label(),
+            'old': json_value(change.old),
+            'new': json_value(change.new),
+        })
+    return events
+
+
+def diff_nvram(old_path: str, new_path: str, map_path: str = None, rom: str = None,
+               output_format: str = 'text', fh: TextIO = None) -> None:
+    """
+    Print the entries that differ between two .nv files, as shown by the --diff option.
+
+    :param old_path: earlier .nv file
+    :param new_path: later .nv file
+    :param map_path: use this map instead of the one for <rom>
+    :param rom: use default map for <rom> instead of one based on <new_path>
+    :param output_format: 'text' or 'ndjson'
+    :param fh: destination for output (default is stdout)
+    """
+    fh = fh or sys.stdout
+    if not map_path:
+        map_path = map_for_rom(rom or rom_for_nvpath(new_path))
+        if not map_path:
+            print("Couldn't find a map for %s" % os.path.basename(new_path), file=sys.stderr)
+            return
+    with open(old_path, 'rb') as f:
+        old = f.read()
+    with open(new_path, 'rb') as f:
+        new = f.read()
+
+    p = ParseNVRAM(None)
+    p.load_map(map_path)
+    changes = p.diff(old, new)
+    if output_format == 'text':
+        old_memory = p.nvram_memory(old)
+        new_memory = p.nvram_memory(new)
+        for change in changes:
+            m = change.mapping
+            label = m.format_label(m.key if m.section in ['audits', 'adjustments'] else None)
+            old_value = m.format_entry(old_memory)
+            new_value = m.format_entry(new_memory)
+            fh.write('%s: %s -> %s\n' % (label, old_value, new_value))
+    else:
+        for event in change_events(new_path, changes):
+            fh.write(json.dumps(event))
+            fh.write('\n')
+
+
+class NvramWatcher(object):
+    """
+    Keep the last snapshot of each .nv file in a directory, and report decoded
+    fields that change when a file is rewritten.  Only entries with an address
+    in a changed byte range are decoded.  See ParseNVRAM.diff() for the fields
+    that are reported.
+    """
+    def __init__(self, directory: str, map_path: str = None, rom: str = None):
+        """
+        :param directory: directory of .nv files (e.g., PinMAME's nvram directory)
+        :param map_path: use this map for all files
+        :param rom: use default map for <rom> for all files
+        """
+        self.directory = directory
+        self.map_path = map_path
+        self.rom = rom
+        self.parsers = {}
+        # contents of last snapshot, keyed by .nv path
+        self.snapshots = {}
+
+    def parser_for(self, nvpath: str) -> Optional[ParseNVRAM]:
+        """Return a ParseNVRAM object with the map for <nvpath>, or None if there isn't one."""
+        map_path = self.map_path or map_for_rom(self.rom or rom_for_nvpath(nvpath))
+        if not map_path:
+            return None
+        p = self.parsers.get(map_path)
+        if p is None:
+            p = ParseNVRAM(None)
+            p.load_map(map_path)
+            self.parsers[map_path] = p
+        return p
+
+    def load(self, nvpath: str) -> Optional[List[dict]]:
+        """
+        Load the current contents of <nvpath>.
+        :return: list of events for fields changed since the last snapshot, or
+                 None if this is the first snapshot, the file can't be read, or
+                 there's no map for it
+        """
+        p = self.parser_for(nvpath)
+        if p is None:
+            return None
+        try:
+            with open(nvpath, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        previous = self.snapshots.get(nvpath)
+        self.snapshots[nvpath] = data
+        if previous is None:
+            return None
+        return change_events(nvpath, p.diff(previous, data))
+
+    def events(self, poll_interval: float = None) -> Iterator[dict]:
+        """
+        Load all .nv files in the directory, then wait for files to change and
+        generate events for their changed fields.
+
+        :param poll_interval: check for changes every <poll_interval> seconds instead
+                              of using inotify (which is only available on Linux)
+        """
+        import glob
+
+        # start watching before loading the first snapshots, so a file written
+        # while loading them is reported instead of missed
+        changed_paths = None
+        if poll_interval is None:
+            changed_paths = inotify_changes(self.directory)
+        if changed_paths is None:
+            changed_paths = poll_changes(self.directory, poll_interval or 1.0)
+
+        for nvpath in sorted(glob.glob(os.path.join(self.directory, '*.nv'))):
+            self.load(nvpath)
+
+        for nvpath in changed_paths:
+            for event in self.load(nvpath) or []:
+                yield event
+
+
 def main() -> None:
+    import argparse
+
     parser = argparse.ArgumentParser(description='PinMAME nvram Parser')
     parser.add_argument('--map',
                         help='use this map (typically ending in .nv.json)')
     parser.add_argument('--rom',
                         help='use default map for <rom> instead of one based on <nvram> filename')
     parser.add_argument('--nvram',
-                        help='nvram file to parse')
+                        help='nvram file (or zip, tar or gzip archive of them) to parse')
     parser.add_argument('--dump',
                         help='dump the contents of <nvram> using <map>', action='store_true')
+    parser.add_argument('--batch', metavar='DIR|GLOB',
+                        help='dump all .nv files in DIR, or files and archives matching GLOB')
+    parser.add_argument('--jobs', type=int,
+                        help='number of worker processes for --batch (default is one per CPU)')
+    parser.add_argument('--output-dir', metavar='DIR',
+                        help='with --batch, write each dump to DIR/<nvram>.txt (or '
+                             'DIR/<archive>/<member>.txt) instead of stdout')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='text',
+                        help='output format for --dump and --batch (default is text)')
+    parser.add_argument('--select', action='append', metavar='PATTERN',
+                        help='with --dump or --batch, only show entries matching PATTERN (e.g., '
+                             '"game_state/credits" or "high_scores/*"); can be repeated')
+    parser.add_argument('--diff', nargs=2, metavar=('OLD', 'NEW'),
+                        help='show entries that changed between two .nv files')
+    parser.add_argument('--watch', metavar='DIR',
+                        help='watch DIR for rewritten .nv files and output changed fields as ndjson')
+    parser.add_argument('--poll', type=float, metavar='SECONDS',
+                        help='with --watch, poll for changes instead of using inotify')
     args = parser.parse_args()
+    if args.jobs is not None and args.jobs < 1:
+        parser.error('--jobs must be at least 1')
+
+    if args.diff:
+        if args.format == 'csv':
+            parser.error('--diff supports text and ndjson formats')
+        diff_nvram(args.diff[0], args.diff[1], args.map, args.rom, args.format)
+
+    elif args.watch:
+        try:
+            for event in NvramWatcher(args.watch, args.map, args.rom).events(args.poll):
+                print(json.dumps(event), flush=True)
+        except KeyboardInterrupt:
+            pass
+
+    elif args.batch:
+        nvpaths = batch_files(args.batch)
+        if not nvpaths:
+            print("No .nv files found for %s" % args.batch)
+            return
+        dump_batch(nvpaths, args.map, args.rom, args.jobs, args.output_dir, args.format,
+                   args.select)
 
-    if args.dump:
-        nvpath = args.nvram
-        basename = os.path.basename(nvpath)
-
-        if nvpath.find('.nv', 0) == -1:
+    elif args.dump:
+        if args.nvram and is_archive(args.nvram):
+            dump_batch([args.nvram], args.map, args.rom, 1, output_format=args.format,
+                       patterns=args.select)
+            return
+        if args.nvram.find('.nv', 0) == -1:
             parser.print_help()
             return
-        with open(nvpath, 'rb') as f:
-            nvram = bytearray(f.read())
-
-        if not args.map:
-            # find a JSON file for the given nvram file
-            if not args.rom:
-                args.rom = rom_for_nvpath(nvpath)
-            args.map = map_for_rom(args.rom)
-
-            if args.map:
-                print("Using map %s for %s" %
-                      (os.path.relpath(args.map), basename))
-            else:
-                print("Couldn't find a map for %s" % basename)
-                return
-
-        with open(args.map, 'r') as f:
-            nv_json = json.load(f)
-
-        print("Dumping known entries for %s [%s]..." % (basename, rom_name(rom_for_nvpath(nvpath))))
-        p = ParseNVRAM(nv_json, nvram)
-        p.dump()
+        if args.select:
+            select_nvram(args.nvram, args.select, args.format, sys.stdout, args.map, args.rom)
+        elif args.format == 'text':
+            dump_nvram(args.nvram, args.map, args.rom)
+        else:
+            export_nvram(args.nvram, args.format, sys.stdout, args.map, args.rom)
 
     else:
         parser.print_help()
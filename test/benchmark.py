@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Benchmark for nvram_parser, using the .nv files in the test directory.
+
+Times each stage of parsing for every file (or every map, for the stages that
+only run once per map), and reports throughput, p50/p99 latency and peak
+memory (from tracemalloc) per stage as JSON:
+
+    map_load        read and json.load() the map file
+    process_json    ParseNVRAM.process_json() on the loaded map
+    load_map        ParseNVRAM.load_map() with a compiled map in CACHE_ROOT
+                    (only if NVRAM_MAP_CACHE is set)
+    set_nvram       ParseNVRAM.set_nvram() with the contents of a .nv file
+    decode:SECTION  ParseNVRAM.iter_values() for each section of the map
+    dump            ParseNVRAM.dump(), with output discarded
+    hex_dump        ParseNVRAM.hex_dump(), with output discarded
+    checksums       ParseNVRAM.checksum_failures()
+
+Save the output of a release with --output, and compare later runs against
+it with --baseline.  Exits with a non-zero status if any stage's p50 latency
+is more than --threshold slower than in the baseline.
+"""
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+# Hack to allow importing nvram_parser from the parent directory.
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import nvram_parser
+
+# glob representing our test files
+NV_GLOB = os.path.join(os.path.dirname(__file__), 'nvram', '*.nv')
+
+
+def percentile(samples: list, fraction: float) -> float:
+    """Return the <fraction> percentile (0.0 to 1.0) of a sorted list of samples."""
+    index = min(len(samples) - 1, max(0, round(fraction * len(samples)) - 1))
+    return samples[index]
+
+
+class StageTimer(object):
+    """Collects the duration (and optionally the peak memory) of each call to a stage."""
+    def __init__(self, trace_memory: bool):
+        self.trace_memory = trace_memory
+        self.samples = {}
+        self.peaks = {}
+
+    def run(self, stage: str, func, *args):
+        """Call func(*args), recording its duration under <stage>, and return its result."""
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            start_size = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        self.samples.setdefault(stage, []).append(elapsed)
+        if self.trace_memory:
+            peak = tracemalloc.get_traced_memory()[1] - start_size
+            self.peaks[stage] = max(self.peaks.get(stage, 0), peak)
+        return result
+
+    def report(self) -> dict:
+        """Return per-stage statistics, with times in milliseconds."""
+        stages = {}
+        for stage, samples in self.samples.items():
+            samples = sorted(samples)
+            total = sum(samples)
+            stages[stage] = {
+                'count': len(samples),
+                'total_ms': total * 1000,
+                'per_second': len(samples) / total if total else None,
+                'p50_ms': percentile(samples, 0.50) * 1000,
+                'p99_ms': percentile(samples, 0.99) * 1000,
+            }
+            if stage in self.peaks:
+                stages[stage]['peak_bytes'] = self.peaks[stage]
+        return stages
+
+
+def load_json_map(map_path: str) -> nvram_parser.ParseNVRAM:
+    p = nvram_parser.ParseNVRAM(None)
+    with open(map_path) as f:
+        p.nv_json = json.load(f)
+    return p
+
+
+def load_cached_map(map_path: str) -> nvram_parser.ParseNVRAM:
+    p = nvram_parser.ParseNVRAM(None)
+    p.load_map(map_path)
+    return p
+
+
+def set_nvram(p: nvram_parser.ParseNVRAM, nv_data: bytes) -> None:
+    p.memory = nvram_parser.SparseMemory()
+    p.set_nvram(bytearray(nv_data))
+
+
+def decode_section(p: nvram_parser.ParseNVRAM, section: str) -> list:
+    return list(p.iter_values(section))
+
+
+def discard_output(func) -> None:
+    with contextlib.redirect_stdout(io.StringIO()):
+        func()
+
+
+def run_benchmark(nvpaths: list, timer: StageTimer) -> None:
+    """Run every stage for each file in <nvpaths>, loading each map once."""
+    parsers = {}
+    for nvpath in nvpaths:
+        map_path = nvram_parser.map_for_rom(nvram_parser.rom_for_nvpath(nvpath))
+        if not map_path:
+            continue
+
+        p = parsers.get(map_path)
+        if p is None:
+            p = timer.run('map_load', load_json_map, map_path)
+            timer.run('process_json', p.process_json)
+            if nvram_parser.CACHE_ROOT:
+                # first call compiles the map into CACHE_ROOT, second call times loading it
+                load_cached_map(map_path)
+                p = timer.run('load_map', load_cached_map, map_path)
+            parsers[map_path] = p
+
+        with open(nvpath, 'rb') as f:
+            nv_data = f.read()
+        timer.run('set_nvram', set_nvram, p, nv_data)
+        for section in sorted(set(m.section for m in p.mapping)):
+            timer.run('decode:%s' % section, decode_section, p, section)
+        timer.run('dump', discard_output, p.dump)
+        timer.run('hex_dump', discard_output, p.hex_dump)
+        timer.run('checksums', p.checksum_failures)
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Return a list of messages for stages whose p50 regressed by more than <threshold>."""
+    regressions = []
+    for stage, stats in sorted(results['stages'].items()):
+        old = baseline['stages'].get(stage)
+        if not old or not old['p50_ms']:
+            continue
+        ratio = stats['p50_ms'] / old['p50_ms']
+        if ratio > 1 + threshold:
+            regressions.append('%s: p50 %.3f ms -> %.3f ms (%+.0f%%)' %
+                               (stage, old['p50_ms'], stats['p50_ms'], (ratio - 1) * 100))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark nvram_parser over the test .nv files')
+    parser.add_argument('--nvram', default=NV_GLOB, metavar='GLOB',
+                        help='.nv files to use (default is test/nvram/*.nv)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of timed passes over the files (default is 3)')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='skip the tracemalloc pass that measures peak memory')
+    parser.add_argument('--output', metavar='FILE',
+                        help='write results to FILE instead of stdout')
+    parser.add_argument('--baseline', metavar='FILE',
+                        help='compare against results saved with --output')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='allowed p50 slowdown against the baseline (default is 0.10)')
+    args = parser.parse_args()
+
+    nvpaths = sorted(glob.glob(args.nvram))
+    if not nvpaths:
+        print('No .nv files found for %s' % args.nvram, file=sys.stderr)
+        sys.exit(1)
+
+    timer = StageTimer(trace_memory=False)
+    for _ in range(args.repeat):
+        run_benchmark(nvpaths, timer)
+    stages = timer.report()
+
+    if not args.no_memory:
+        # separate pass, since tracing allocations slows everything down
+        memory_timer = StageTimer(trace_memory=True)
+        tracemalloc.start()
+        run_benchmark(nvpaths, memory_timer)
+        tracemalloc.stop()
+        for stage, peak in memory_timer.peaks.items():
+            stages[stage]['peak_bytes'] = peak
+
+    results = {
+        'python': sys.version.split()[0],
+        'files': len(nvpaths),
+        'repeat': args.repeat,
+        'stages': stages,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for message in regressions:
+            print('Regression in %s' % message, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
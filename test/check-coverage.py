@@ -8,7 +8,6 @@ Displays uncovered ROMs on maps with no/partial coverage.
 If there are maps without any coverage, the script sets a non-zero exit code.
 """
 import glob
-import json
 import os
 import sys
 
@@ -23,9 +22,8 @@ NV_GLOB = os.path.join(os.path.dirname(__file__), 'nvram', '*.nv')
 # list of JSON files covered by at least one ROM
 map_coverage = []
 
-# first load the index and build dictionary of map files
-with open(os.path.join(nvram_parser.MAPS_ROOT, 'index.json')) as f:
-    index = json.load(f)
+# copy of the index, as a dictionary of map files keyed by ROM
+index = dict(nvram_parser.rom_index.map_files())
 
 # go through our test files, and track coverage
 for nvfile in glob.glob(NV_GLOB):
@@ -47,10 +45,6 @@ map_files = {}
 
 # look at what's left
 for rom, file in index.items():
-    if rom.startswith('_'):
-        # skip over _note entry
-        continue
-
     # we don't have coverage for <rom>, but maybe we have coverage for <file>
     rom_list = map_files.get(file)
     if rom_list:
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Test for nvdaemon: start a daemon on a temporary socket, with the fixture .nv
+files as its root directory, and print its responses to a series of requests.
+"""
+import base64
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+# Hack to allow importing nvdaemon from the parent directory.
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import nvdaemon
+
+FIXTURES = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'fixtures', 'nvram')
+
+with open(os.path.join(FIXTURES, 'fixt_10.nv'), 'rb') as f:
+    FIXT_10_DATA = base64.b64encode(f.read()).decode('ascii')
+
+REQUESTS = [
+    {'op': 'ping'},
+    {'op': 'decode', 'nvram': 'fixt_11.nv'},
+    {'op': 'high_scores', 'nvram': 'fixt_10.nv'},
+    {'op': 'high_scores', 'rom': 'fixt_10', 'data': FIXT_10_DATA},
+    {'op': 'diff', 'old': 'fixt_10.nv', 'new': 'fixt_10-new.nv', 'rom': 'fixt_10'},
+    {'op': 'decode', 'nvram': 'missing_10.nv'},
+    {'op': 'decode', 'nvram': '../maps/romnames.json'},
+    {'op': 'decode', 'nvram': 42},
+    {'op': 'decode'},
+    {'op': 'bogus'},
+    [1],
+]
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    socket_path = os.path.join(directory, 'nvdaemon.sock')
+    try:
+        server = nvdaemon.NvramDaemon(socket_path, root=FIXTURES)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            print('socket mode: %o' % (os.stat(socket_path).st_mode & 0o777))
+            for request in REQUESTS:
+                response = json.dumps(nvdaemon.query(request, socket_path))
+                # errors may include the path of the root directory
+                response = response.replace(FIXTURES, '<root>')
+                print('%s -> %s' % (json.dumps(request)[:80], response))
+        finally:
+            server.shutdown()
+            server.server_close()
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Test for DecodeCache: dump the fixture .nv files with the cache enabled, and
+print its stats after each step, including evictions from a small cache,
+stats merged from other processes and the report printed at exit.
+"""
+import contextlib
+import io
+import os
+import sys
+
+# Hack to allow importing nvram_parser from the parent directory.
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import nvram_parser
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'nvram')
+STATS = ['hits', 'misses', 'evictions', 'size', 'maxsize', 'processes']
+
+
+def print_stats(description: str) -> None:
+    stats = nvram_parser.decode_cache.stats()
+    print('%s: %s' % (description, ', '.join('%s %u' % (key, stats[key]) for key in STATS)))
+
+
+def dump(p: nvram_parser.ParseNVRAM, name: str) -> str:
+    with open(os.path.join(FIXTURES, name), 'rb') as f:
+        p.set_nvram(bytearray(f.read()))
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        p.dump()
+    return output.getvalue()
+
+
+def main():
+    cache = nvram_parser.decode_cache
+    p = nvram_parser.ParseNVRAM(None)
+    p.load_map(nvram_parser.find_map('fixt_10.nv'))
+    expected = dump(p, 'fixt_10.nv')
+
+    cache.enable(1000)
+    print('same dump with cache: %s' % (dump(p, 'fixt_10.nv') == expected))
+    print_stats('first dump')
+    print('same dump from cache: %s' % (dump(p, 'fixt_10.nv') == expected))
+    print_stats('second dump')
+    dump(p, 'fixt_10-new.nv')
+    print_stats('changed file')
+
+    cache.enable(4)
+    dump(p, 'fixt_10.nv')
+    print_stats('small cache')
+    print('same dump from small cache: %s' % (dump(p, 'fixt_10.nv') == expected))
+    print_stats('small cache again')
+
+    # each lookup of a list value returns a copy
+    cache.enable(1000)
+    bits = nvram_parser.RamMapping({'start': '0x30', 'encoding': 'bits',
+                                    'values': list('ABCDEFGH')}, p.metadata)
+    (first, _) = cache.lookup(bits, p.memory)
+    first.append('changed')
+    (second, _) = cache.lookup(bits, p.memory)
+    print('bits value: %s, copied: %s' % (second, first is not second))
+
+    # stats from two tasks in one worker process, and one task in another
+    cache.enable(1000)
+    dump(p, 'fixt_10.nv')
+    cache.merge({'pid': 101, 'hits': 5, 'misses': 10, 'evictions': 0, 'size': 10})
+    cache.merge({'pid': 101, 'hits': 7, 'misses': 1, 'evictions': 0, 'size': 11})
+    cache.merge({'pid': 102, 'hits': 3, 'misses': 4, 'evictions': 2, 'size': 4})
+    print_stats('merged')
+    report = io.StringIO()
+    with contextlib.redirect_stderr(report):
+        nvram_parser.report_decode_cache()
+    print(report.getvalue(), end='')
+
+    cache.disable()
+    print('same dump after disable: %s' % (dump(p, 'fixt_10.nv') == expected))
+    print_stats('disabled')
+
+
+if __name__ == '__main__':
+    main()
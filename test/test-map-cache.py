@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test for compiled maps: with NVRAM_MAP_CACHE set to a temporary directory,
+load a copy of the fixture map several times, changing its platform file and
+the map itself in between, and report whether each load used the cache.
+"""
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+
+DIRECTORY = tempfile.mkdtemp()
+os.environ['NVRAM_MAP_CACHE'] = os.path.join(DIRECTORY, 'cache')
+os.environ['NVRAM_MAPS_ROOT'] = os.path.join(DIRECTORY, 'maps')
+
+# Hack to allow importing nvram_parser from the parent directory.
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import nvram_parser
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+MAP_PATH = os.path.join(nvram_parser.MAPS_ROOT, 'fixture.nv.json')
+PLATFORM_PATH = nvram_parser.platform_path('fixture')
+
+
+def dump(p: nvram_parser.ParseNVRAM) -> str:
+    with open(os.path.join(FIXTURES, 'nvram', 'fixt_10.nv'), 'rb') as f:
+        p.set_nvram(bytearray(f.read()))
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        p.dump()
+    return output.getvalue()
+
+
+def load(description: str) -> nvram_parser.ParseNVRAM:
+    """Load the map, and report whether it came from the cache (without reading the platform)."""
+    p = nvram_parser.ParseNVRAM(None)
+    platform_loads = []
+    load_platform = p.load_platform
+    p.load_platform = lambda name: platform_loads.append(name) or load_platform(name)
+    p.load_map(MAP_PATH)
+    print('%s: %s, %u compiled maps' % (description, 'miss' if platform_loads else 'hit',
+                                        len(os.listdir(nvram_parser.CACHE_ROOT))))
+    return p
+
+
+def main():
+    try:
+        shutil.copytree(os.path.join(FIXTURES, 'maps'), nvram_parser.MAPS_ROOT)
+        expected = nvram_parser.ParseNVRAM(None)
+        expected.load_json(MAP_PATH)
+
+        load('first load')
+        p = load('second load')
+        print('same dump as load_json(): %s' % (dump(p) == dump(expected)))
+        print('same plans as load_json(): %s' %
+              ([m.plan() for m in p.mapping] == [m.plan() for m in expected.mapping]))
+
+        # a new modification time alone doesn't invalidate the compiled map
+        stat = os.stat(PLATFORM_PATH)
+        os.utime(PLATFORM_PATH, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        load('platform file touched')
+        digests = []
+        file_digest = nvram_parser.file_digest
+        nvram_parser.file_digest = lambda path: digests.append(path) or file_digest(path)
+        load('load after touch')
+        nvram_parser.file_digest = file_digest
+        print('platform file read: %s' % bool(digests))
+
+        with open(PLATFORM_PATH) as f:
+            platform = f.read()
+        with open(PLATFORM_PATH, 'w') as f:
+            f.write(platform.replace('"cpu": "M6809"', '"cpu": "M6800"'))
+        p = load('platform file changed')
+        print('cpu: %s' % p.platform['cpu'])
+        p = load('load after platform change')
+        print('cpu: %s' % p.platform['cpu'])
+
+        with open(MAP_PATH, 'a') as f:
+            f.write('\n')
+        load('map file changed')
+
+        # a truncated file is ignored and replaced
+        for name in os.listdir(nvram_parser.CACHE_ROOT):
+            with open(os.path.join(nvram_parser.CACHE_ROOT, name), 'r+b') as f:
+                f.truncate(100)
+        load('compiled map truncated')
+        load('load after truncation')
+    finally:
+        shutil.rmtree(DIRECTORY)
+
+
+if __name__ == '__main__':
+    main()
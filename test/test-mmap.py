@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Test for memory-mapped .nv files: edit a copy of a fixture file in place,
+load another file after it, and close mappings with and without views of the
+file still in use.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+# Hack to allow importing nvram_parser from the parent directory.
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import nvram_parser
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'nvram')
+
+
+def entry(p: nvram_parser.ParseNVRAM, key: str) -> nvram_parser.RamMapping:
+    return next(m for m in p.mapping if m.key == key)
+
+
+def read_file(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        path_a = os.path.join(directory, 'fixt_10.nv')
+        path_b = os.path.join(directory, 'fixt_10-new.nv')
+        shutil.copy(os.path.join(FIXTURES, 'fixt_10.nv'), path_a)
+        shutil.copy(os.path.join(FIXTURES, 'fixt_10-new.nv'), path_b)
+
+        p = nvram_parser.ParseNVRAM(None)
+        p.load_map(nvram_parser.find_map(path_a))
+        credits = entry(p, 'credits')
+        country = entry(p, 'country')
+
+        print('== editing a writable mapping')
+        p.load_nvram(path_a, use_mmap=True, writable=True)
+        print('credits: %s, country: %s' % (credits.format_entry(p.memory),
+                                            country.format_entry(p.memory)))
+        credits.set_value(p.memory, 9)
+        country.set_value(p.memory, 2)
+        p.memory.flush()
+        q = nvram_parser.ParseNVRAM(None)
+        q.load_map(nvram_parser.find_map(path_a))
+        q.load_nvram(path_a)
+        print('file after edit: credits %s, country %s, size %u' % (
+            credits.format_entry(q.memory), country.format_entry(q.memory),
+            len(read_file(path_a))))
+        print('get_dot_nv() matches file: %s' % (p.get_dot_nv() == read_file(path_a)))
+
+        print('== loading another file after the mapping')
+        edited = read_file(path_a)
+        p.load_nvram(path_b)
+        print('credits: %s' % credits.format_entry(p.memory))
+        credits.set_value(p.memory, 7)
+        p.set_nvram(bytearray(read_file(path_b)))
+        print('mapped file unchanged: %s' % (read_file(path_a) == edited))
+        print('other file unchanged: %s' % (read_file(path_b) == read_file(
+            os.path.join(FIXTURES, 'fixt_10-new.nv'))))
+
+        print('== closing a mapping')
+        p.load_nvram(path_a, use_mmap=True)
+        view = p.memory.read(credits.offsets()[0], 1)
+        part = p.memory.read(0, 8)[2:4]
+        for name in ['view', 'part']:
+            try:
+                p.memory.close()
+                print('close with %s in use: closed' % name)
+            except BufferError:
+                print('close with %s in use: BufferError, still mapped: %s, credits: %s' % (
+                    name, p.memory.mapped is not None, credits.format_entry(p.memory)))
+            if name == 'view':
+                print('view: %u' % view[0])
+                del view
+            else:
+                print('part: %s' % part.hex())
+                del part
+        p.memory.close()
+        print('closed: mapped %s, regions %u, PinMAME data %s' % (
+            p.memory.mapped, len(p.memory.memory), p.memory.get_pinmame_data()))
+        p.memory.close()
+        p.load_nvram(path_a, use_mmap=True)
+        print('reloaded: credits %s' % credits.format_entry(p.memory))
+        p.memory.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Test for nvbatch: aggregate audits from the fixture .nv files (including one
+that's shorter than the others, one that doesn't exist and one without a map)
+by ROM and by map, and print the statistics as JSON.
+"""
+import glob
+import json
+import os
+import sys
+
+# Hack to allow importing nvbatch from the parent directory.
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import nvbatch
+
+# relative to the current directory, so the output doesn't depend on where the repo is
+FIXTURES = os.path.relpath(os.path.join(os.path.dirname(__file__), 'fixtures', 'nvram'))
+
+AUDITS = ['Games Started', 'Total Coins', 'audits/02 Earnings Audits/02', 'Unknown Audit']
+
+
+def main():
+    nvpaths = sorted(glob.glob(os.path.join(FIXTURES, '*.nv')))
+    nvpaths.append(os.path.join(FIXTURES, 'fixt_10-missing.nv'))
+    nvpaths.append(os.path.join(FIXTURES, 'nomap_10.nv'))
+
+    by_rom = nvbatch.aggregate_files(nvpaths, AUDITS)
+    print('by rom:')
+    print(json.dumps(by_rom, indent=2, sort_keys=True))
+
+    by_map = nvbatch.aggregate_files(nvpaths, AUDITS, group_by=['map'])
+    print('by map:')
+    print(json.dumps({os.path.basename(map_path): stats for (map_path, stats) in by_map.items()},
+                     indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
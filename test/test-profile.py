@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Test for NVRAM_PARSER_PROFILE: dump a fixture .nv file with and without it,
+and print the stages and call counts from the summary and the trace (times
+vary between runs, so they're only checked for consistency).
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+PARSER = os.path.join(TEST_DIR, '..', 'nvram_parser.py')
+FIXTURES = os.path.join(TEST_DIR, 'fixtures')
+
+
+def run(profile: str = None) -> subprocess.CompletedProcess:
+    env = dict(os.environ, NVRAM_MAPS_ROOT=os.path.join(FIXTURES, 'maps'))
+    # a compiled map would skip some stages
+    for name in ['NVRAM_PARSER_PROFILE', 'NVRAM_MAP_CACHE', 'NVRAM_DECODE_CACHE']:
+        env.pop(name, None)
+    if profile:
+        env['NVRAM_PARSER_PROFILE'] = profile
+    return subprocess.run([sys.executable, PARSER, '--nvram', os.path.join(FIXTURES, 'nvram', 'fixt_10.nv'),
+                           '--dump'], env=env, capture_output=True, text=True)
+
+
+def main():
+    expected = run()
+
+    print('== NVRAM_PARSER_PROFILE=1')
+    result = run('1')
+    print('same stdout: %s' % (result.stdout == expected.stdout))
+    lines = result.stderr.splitlines()
+    print(lines[0])
+    counts = {}
+    for line in lines[1:]:
+        (stage, calls, total, self_total, mean) = line.split()
+        counts[stage] = int(calls)
+        if float(self_total) > float(total):
+            print('%s: self time %s is more than total time %s' % (stage, self_total, total))
+    for stage in sorted(counts):
+        print('%-20s %u' % (stage, counts[stage]))
+
+    print('== NVRAM_PARSER_PROFILE=<trace path>')
+    directory = tempfile.mkdtemp()
+    try:
+        trace_path = os.path.join(directory, 'trace.json')
+        result = run(trace_path)
+        print('same stdout: %s' % (result.stdout == expected.stdout))
+        print('same summary stages: %s' % (
+            sorted(line.split()[0] for line in result.stderr.splitlines()[1:]) == sorted(counts)))
+        with open(trace_path) as f:
+            trace = json.load(f)
+        events = {}
+        for event in trace['traceEvents']:
+            events[event['name']] = events.get(event['name'], 0) + 1
+        print('trace events match call counts: %s' % (events == counts))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Test for --watch: copy a fixture .nv file to a temporary directory, rewrite it
+with a later snapshot, and print the change events as ndjson.
+
+Uses the same steps as NvramWatcher.events() (start watching, load the first
+snapshot, then load each changed file), but polls for changes one step at a
+time so the output doesn't depend on timing.
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+# Hack to allow importing nvram_parser from the parent directory.
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import nvram_parser
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'nvram')
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        nvpath = os.path.join(directory, 'fixt_10.nv')
+        shutil.copy(os.path.join(FIXTURES, 'fixt_10.nv'), nvpath)
+
+        watcher = nvram_parser.NvramWatcher(directory)
+        changes = nvram_parser.poll_changes(directory, interval=0.01)
+        print('first snapshot: %s' % watcher.load(nvpath))
+
+        # replace the file the way PinMAME does, and make sure its time changes
+        temp_path = nvpath + '.tmp'
+        shutil.copy(os.path.join(FIXTURES, 'fixt_10-new.nv'), temp_path)
+        stat = os.stat(nvpath)
+        os.utime(temp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        os.replace(temp_path, nvpath)
+
+        changed = next(changes)
+        print('changed: %s' % os.path.basename(changed))
+        for event in watcher.load(changed):
+            print(json.dumps(event))
+
+        print('unchanged: %s' % watcher.load(nvpath))
+
+
+if __name__ == '__main__':
+    main()
@@ -11,15 +11,79 @@ trap 'RC=1' ERR
 
 (
   cd "$SCRIPT_PATH"  || exit 1
-  mkdir -p results
-  rm -f results/*.txt
+  mkdir -p results results-batch
+  rm -f results/*.txt results-batch/*.txt
   for file in nvram/*.nv; do
     filename=$(basename "$file")
     python3 ../nvram_parser.py --nvram "$file" --dump > "results/$filename.txt" 2>&1
   done
   diff --unified --recursive --ignore-matching-lines '^Using map ' expected results | more
 
+  # the same dumps from a single --batch run
+  python3 ../nvram_parser.py --batch nvram --output-dir results-batch
+  diff --unified --recursive --ignore-matching-lines '^Using map ' expected results-batch | more
+
   python3 check-coverage.py
+
+  # feature tests, using the small map and .nv files in fixtures
+  export NVRAM_MAPS_ROOT=fixtures/maps
+  FIXTURES=fixtures/nvram
+  rm -rf results-features
+  mkdir -p results-features
+  python3 ../nvram_parser.py --nvram $FIXTURES/fixt_10.nv --dump > results-features/dump.txt 2>&1
+  python3 ../nvram_parser.py --nvram $FIXTURES/fixt_10.nv --dump --format ndjson > results-features/dump.ndjson 2>&1
+  python3 ../nvram_parser.py --nvram $FIXTURES/fixt_10.nv --dump --format csv > results-features/dump.csv 2>&1
+  python3 ../nvram_parser.py --batch $FIXTURES --format csv --jobs 2 > results-features/batch.csv 2>&1
+  for JOBS in 0 -1; do
+    python3 ../nvram_parser.py --batch $FIXTURES --jobs $JOBS 2>&1 | tail -n 1
+  done > results-features/batch-jobs.txt
+  python3 ../nvram_parser.py --diff $FIXTURES/fixt_10.nv $FIXTURES/fixt_10-new.nv > results-features/diff.txt 2>&1
+  python3 ../nvram_parser.py --diff $FIXTURES/fixt_10.nv $FIXTURES/fixt_10-new.nv --format ndjson \
+    > results-features/diff.ndjson 2>&1
+  python3 test-watch.py > results-features/watch.txt 2>&1
+  # archives are built in a temporary directory, outside of the compared results
+  ARCHIVES=$(mktemp -d)
+  mkdir -p $ARCHIVES/x $ARCHIVES/y
+  cp $FIXTURES/fixt_10.nv $ARCHIVES/x/fixt_10.nv
+  cp $FIXTURES/fixt_10-new.nv $ARCHIVES/y/fixt_10.nv
+  (cd $ARCHIVES && python3 -m zipfile -c fixtures.zip x y \
+    && tar czf fixtures.tar.gz x/fixt_10.nv y/fixt_10.nv)
+  python3 ../nvram_parser.py --batch "$ARCHIVES/fixtures.*" --jobs 2 --output-dir results-features/archive \
+    > results-features/archive.txt 2>&1
+  python3 ../nvram_parser.py --batch "$ARCHIVES/*/fixt_10.nv" --jobs 1 --output-dir results-features/collision \
+    > results-features/collision.txt 2>&1
+  python3 ../nvram_parser.py --nvram $ARCHIVES/fixtures.zip --dump --select 'game_state/*' --format csv \
+    > results-features/archive-select.csv 2>&1
+  rm -rf $ARCHIVES
+  python3 test-daemon.py > results-features/daemon.txt 2>&1
+  SELECT=(--select 'game_state/*' --select 'high_scores/*')
+  python3 ../nvram_parser.py --nvram $FIXTURES/fixt_10.nv --dump "${SELECT[@]}" > results-features/select.txt 2>&1
+  python3 ../nvram_parser.py --nvram $FIXTURES/fixt_10.nv --dump "${SELECT[@]}" --format ndjson \
+    > results-features/select.ndjson 2>&1
+  python3 ../nvram_parser.py --nvram $FIXTURES/fixt_10.nv --dump "${SELECT[@]}" --format csv \
+    > results-features/select.csv 2>&1
+  python3 ../nvram_parser.py --batch $FIXTURES --select 'audits/*/01' --jobs 1 > results-features/select-batch.txt 2>&1
+  python3 ../leaderboard.py --top 3 $FIXTURES/*.nv > results-features/leaderboard.txt 2>&1
+  python3 ../leaderboard.py --top 3 --by map $FIXTURES/*.nv > results-features/leaderboard-map.txt 2>&1
+  python3 ../leaderboard.py --top 3 $FIXTURES/fixt_10-missing.nv $FIXTURES/fixt_11.nv \
+    > results-features/leaderboard-missing.txt 2>&1
+  # nvbatch needs numpy; without it, nvbatch.txt is left out of the comparison
+  EXCLUDE=()
+  if python3 -c 'import numpy' 2> /dev/null; then
+    python3 test-nvbatch.py > results-features/nvbatch.txt 2>&1
+  else
+    echo "numpy isn't installed; skipping the nvbatch test"
+    EXCLUDE=(--exclude nvbatch.txt)
+  fi
+  python3 test-map-cache.py > results-features/map-cache.txt 2>&1
+  python3 test-mmap.py > results-features/mmap.txt 2>&1
+  python3 test-decode-cache.py > results-features/decode-cache.txt 2>&1
+  python3 test-profile.py > results-features/profile.txt 2>&1
+  # the stats reported at exit include the worker processes of --batch
+  NVRAM_DECODE_CACHE=1000 python3 ../nvram_parser.py --batch $FIXTURES --format csv --jobs 2 \
+    2> results-features/decode-cache-batch.txt > /dev/null
+  diff --unified --recursive --ignore-matching-lines '^Using map ' "${EXCLUDE[@]}" \
+    expected-features results-features | more
 )
 
 exit $RC